@@ -1,11 +1,27 @@
 from aiogram import Dispatcher
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
+from bot.middlewares import SessionMiddleware
+from config import Config
+
+
+def create_fsm_storage() -> BaseStorage:
+    """Хранилище состояний FSM: при STORAGE_URL - во внешнем хранилище"""
+    if Config.STORAGE_URL:
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        return RedisStorage.from_url(Config.STORAGE_URL)
+    return MemoryStorage()
 
 
 def create_dispatcher() -> Dispatcher:
     """Создание диспетчера"""
-    storage = MemoryStorage()
-    return Dispatcher(storage=storage)
+    storage = create_fsm_storage()
+    dispatcher = Dispatcher(storage=storage)
+    # Сессия восстанавливается до фильтров по состоянию FSM
+    dispatcher.message.outer_middleware(SessionMiddleware())
+    dispatcher.callback_query.outer_middleware(SessionMiddleware())
+    return dispatcher
 
 
 # Глобальный экземпляр диспетчера
@@ -0,0 +1,77 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from services.session_manager import session_manager, UserSession
+from states.analytics import AnalyticsState
+
+# Состояния, за которыми стоят данные анализа в памяти процесса
+_MAIN_REPORT_STATES = {
+    AnalyticsState.waiting_for_extra_main_file.state,
+    AnalyticsState.waiting_for_cost_file.state,
+}
+_ANALYSIS_STATES = {
+    AnalyticsState.ready_for_analysis.state,
+    AnalyticsState.changing_tax.state,
+    AnalyticsState.waiting_for_new_tax.state,
+}
+
+
+def _is_stale(session: UserSession, state: str) -> bool:
+    """Состояние FSM ссылается на данные, которых нет в сессии"""
+    if state in _MAIN_REPORT_STATES:
+        return session.main_df is None
+    if state in _ANALYSIS_STATES:
+        return session.final_df is None
+    return False
+
+
+class SessionMiddleware(BaseMiddleware):
+    """Восстановление сессии пользователя после перезапуска бота.
+
+    Состояние FSM при STORAGE_URL переживает перезапуск и истечение сессии,
+    а данные анализа - нет. Для новой сессии ставка налога читается из
+    хранилища, а состояние, за которым не осталось данных, сбрасывается к
+    загрузке основного отчета с объяснением пользователю.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        state: FSMContext = data.get("state")
+        if user is None or state is None:
+            return await handler(event, data)
+
+        session = session_manager.get_session(user.id)
+        if session.restored:
+            return await handler(event, data)
+        await session_manager.restore(session)
+
+        raw_state = data.get("raw_state")
+        if raw_state is None or not _is_stale(session, raw_state):
+            return await handler(event, data)
+
+        await state.set_state(AnalyticsState.waiting_for_main_file)
+        data["raw_state"] = AnalyticsState.waiting_for_main_file.state
+        if isinstance(event, Message) and event.text and event.text.startswith("/"):
+            # Команды (/start и другие) выполняются как обычно
+            return await handler(event, data)
+
+        text = (
+            "⚠️ Данные анализа не сохранились: бот перезапускался "
+            "или сессия истекла.\n\n"
+            f"💵 <b>Налоговая ставка:</b> {session.tax_rate}%\n"
+            "📁 Отправьте основной отчет заново."
+        )
+        if isinstance(event, CallbackQuery):
+            await event.answer()
+            if event.message is not None:
+                await event.message.answer(text)
+        elif isinstance(event, Message):
+            await event.answer(text)
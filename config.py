@@ -1,5 +1,6 @@
 import os
 import logging
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,9 +11,68 @@ class Config:
 
     BOT_TOKEN = os.getenv("BOT_TOKEN")
     MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+    MAX_UNPACKED_SIZE = 200 * 1024 * 1024  # суммарно для файлов в ZIP-архиве
     PROCESSING_TIMEOUT = 300  # 5 минут
     DEFAULT_TAX_RATE = 6.0
 
+    # Пул для тяжелых вычислений: "process" или "thread"
+    WORKER_POOL_KIND = os.getenv("WORKER_POOL_KIND", "process")
+    WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", "2"))
+
+    # Способы чтения Excel в порядке приоритета (недоступные пропускаются).
+    # Первым идет потоковый openpyxl: в памяти только нужные колонки.
+    # calamine (нужен для xls) загружает лист целиком в нативную память,
+    # pandas - в Python-объекты, поэтому они только запасные
+    EXCEL_READER_BACKENDS = os.getenv(
+        "EXCEL_READER_BACKENDS", "openpyxl,calamine,pandas"
+    ).split(",")
+
+    # Бюджет памяти кэша обработанных основных отчетов
+    REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_MB", "64")) * 1024 * 1024
+
+    # Время жизни сессии без активности, часов
+    SESSION_TTL_HOURS = float(os.getenv("SESSION_TTL_HOURS", "24"))
+
+    # Бюджет памяти DataFrame всех сессий, сверх него данные давних сессий выгружаются
+    SESSION_MEMORY_BUDGET = (
+        int(os.getenv("SESSION_MEMORY_BUDGET_MB", "512")) * 1024 * 1024
+    )
+
+    # Выгрузка DataFrame сессий на диск после простоя (0 - не выгружать)
+    SESSION_SPILL_AFTER_MINUTES = int(os.getenv("SESSION_SPILL_AFTER_MINUTES", "30"))
+    SPILL_DIR = os.getenv(
+        "SPILL_DIR", os.path.join(tempfile.gettempdir(), "wb_analytics_bot_sessions")
+    )
+
+    # Фоновое построение Excel и PDF сразу после готовности анализа
+    PRERENDER_REPORTS = os.getenv("PRERENDER_REPORTS", "").lower() in ("1", "true", "yes")
+
+    # Каталог временных файлов отчетов перед отправкой
+    ARTIFACT_DIR = os.getenv(
+        "ARTIFACT_DIR", os.path.join(tempfile.gettempdir(), "wb_analytics_bot")
+    )
+
+    # Строк полной таблицы на странице PDF
+    PDF_ROWS_PER_PAGE = int(os.getenv("PDF_ROWS_PER_PAGE", "36"))
+
+    # Быстрая PNG-сводка после завершения анализа
+    QUICK_LOOK = os.getenv("QUICK_LOOK", "1").lower() in ("1", "true", "yes")
+    QUICK_LOOK_DPI = int(os.getenv("QUICK_LOOK_DPI", "80"))
+
+    # Фоновая загрузка библиотек, шрифтов и процессов пула после старта
+    WARMUP = os.getenv("WARMUP", "1").lower() in ("1", "true", "yes")
+
+    # Внешнее хранилище FSM, рефералов и ставок налога, например
+    # redis://localhost:6379/0: они переживают перезапуск бота (без него -
+    # память процесса). Бот получает обновления через polling, поэтому
+    # запущен один экземпляр; данные анализа и статистика админки остаются
+    # в его памяти и файлах
+    STORAGE_URL = os.getenv("STORAGE_URL")
+
+    # Файл SQLite со статистикой пользователей (пусто - только в памяти)
+    STATS_DB_PATH = os.getenv("STATS_DB_PATH", "wb_analytics_bot.sqlite3")
+    STATS_FLUSH_SECONDS = float(os.getenv("STATS_FLUSH_SECONDS", "30"))
+
     # 🔐 АДМИНСКИЕ НАСТРОЙКИ
     ADMIN_IDS = (
         list(map(int, os.getenv("ADMIN_IDS", "").split(",")))
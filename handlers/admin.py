@@ -8,12 +8,15 @@ from bot.dispatcher import dp
 from bot.bot import bot
 from config import Config
 from services.admin_manager import admin_manager
-from services.admin_reporter import AdminReporter
 from services.session_manager import session_manager
+from services.worker_pool import worker_pool
 from states.admin import AdminState
 from keyboards.admin import AdminKeyboard
+from utils.lazy import LazyImport
 from utils.logger import logger
 
+AdminReporter = LazyImport("services.admin_reporter", "AdminReporter")
+
 def is_admin(user_id: int) -> bool:
     """Проверка прав администратора"""
     return user_id in Config.ADMIN_IDS
@@ -145,7 +148,12 @@ async def handle_export(callback: CallbackQuery):
         processing_msg = await callback.message.answer("⏳ <b>Генерирую отчет...</b>")
         
         if export_type == "excel":
-            excel_file = AdminReporter.generate_users_excel()
+            excel_file = await worker_pool.run(
+                AdminReporter.generate_users_excel,
+                admin_manager.get_user_records(),
+                admin_manager.get_bot_stats(),
+                admin_manager.get_top_users(20),
+            )
             file = BufferedInputFile(
                 excel_file.getvalue(),
                 filename=f"wb_bot_stats_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
@@ -154,7 +162,9 @@ async def handle_export(callback: CallbackQuery):
             await callback.message.answer_document(file, caption=caption)
             
         elif export_type == "charts":
-            chart_file = AdminReporter.generate_activity_chart()
+            chart_file = await worker_pool.run(
+                AdminReporter.generate_activity_chart, admin_manager.get_user_records()
+            )
             file = BufferedInputFile(
                 chart_file.getvalue(),
                 filename=f"wb_activity_chart_{datetime.now().strftime('%Y%m%d_%H%M')}.png"
@@ -3,25 +3,131 @@ import async_timeout
 from io import BytesIO
 
 from aiogram import F
-from aiogram.types import Message, BufferedInputFile
+from aiogram.filters import StateFilter
+from aiogram.types import Message, BufferedInputFile, CallbackQuery
 from aiogram.fsm.context import FSMContext
 
 from bot.dispatcher import dp
 from bot.bot import bot
 from services.session_manager import session_manager
+from services.single_flight import SingleFlight
 from services.validators import FileValidator
-from services.data_processor import DataProcessor
+from services.worker_pool import worker_pool
+from services.report_cache import ReportCache, report_cache
 from keyboards.factories import KeyboardFactory
 from states.analytics import AnalyticsState
 from config import Config
+from utils.lazy import LazyImport
 from utils.logger import logger
 from services.admin_manager import admin_manager
 
+# pandas и openpyxl загружаются при первой обработке файла, а не при старте
+DataProcessor = LazyImport("services.data_processor", "DataProcessor")
+ReportGenerator = LazyImport("services.report_generator", "ReportGenerator")
+ReportRenderer = LazyImport("services.report_renderer", "ReportRenderer")
 
-@dp.message(AnalyticsState.waiting_for_main_file, F.document)
+# Разбор основного отчета: один на пользователя. Новый файл отменяет прежний,
+# а при добавлении отчетов за другие периоды встает за ним в очередь
+main_file_jobs = SingleFlight()
+
+
+async def _download_document(doc) -> BytesIO:
+    """Скачивание документа из Telegram в память"""
+    file = await bot.get_file(doc.file_id)
+    file_bytes = BytesIO()
+    await bot.download_file(file.file_path, destination=file_bytes)
+    file_bytes.seek(0)
+    return file_bytes
+
+
+async def _load_main_partial(doc, user_id: int):
+    """Частичные агрегаты основного отчета и хеш его содержимого"""
+    # Повторно присланный файл берется из кэша без скачивания и разбора
+    content_hash = report_cache.key_for(doc.file_unique_id)
+    partial = report_cache.get(content_hash)
+    if partial is None:
+        file_bytes = await _download_document(doc)
+        content_hash = ReportCache.content_hash(file_bytes)
+        partial = report_cache.get(content_hash)
+        if partial is None:
+            partial = await worker_pool.run(
+                DataProcessor.aggregate_main_report,
+                file_bytes,
+                doc.file_name,
+                owner=user_id,
+            )
+        report_cache.put(content_hash, partial, doc.file_unique_id)
+    return partial, content_hash
+
+
+async def _send_quick_look(message: Message, session):
+    """Быстрая PNG-сводка сразу после анализа (без запроса PDF)"""
+    try:
+        image = await worker_pool.run(
+            ReportGenerator.generate_quick_look,
+            session.final_df,
+            owner=session.user_id,
+        )
+        await message.answer_photo(
+            BufferedInputFile(image.getvalue(), filename="summary.png"),
+            caption="📊 <b>Краткая сводка</b>",
+        )
+    except Exception as e:
+        # Сводка необязательна - анализ и отчеты доступны и без нее
+        logger.warning(f"Quick look failed: {e}")
+
+
+@dp.callback_query(F.data == "add_main_report")
+async def add_main_report(callback: CallbackQuery, state: FSMContext):
+    """Добавление отчета за другой период к уже загруженным"""
+    session = session_manager.get_session(callback.from_user.id)
+
+    if session.main_partial is None:
+        await callback.answer("⚠️ Сначала отправьте основной отчет!", show_alert=True)
+        return
+
+    await state.set_state(AnalyticsState.waiting_for_extra_main_file)
+    await callback.message.edit_text(
+        f"📁 <b>Загружено отчетов:</b> {len(session.main_report_keys)}\n\n"
+        "Отправьте следующий отчет Wildberries - он будет объединен с уже "
+        "загруженными в один расчет.",
+        reply_markup=KeyboardFactory.get_extra_main_report_keyboard(),
+    )
+    await callback.answer()
+
+
+@dp.callback_query(F.data == "skip_extra_main_report")
+async def skip_extra_main_report(callback: CallbackQuery, state: FSMContext):
+    """Возврат к загрузке себестоимости без дополнительного отчета"""
+    session = session_manager.get_session(callback.from_user.id)
+
+    if session.main_df is None:
+        await callback.answer("⚠️ Сначала отправьте основной отчет!", show_alert=True)
+        return
+
+    await state.set_state(AnalyticsState.waiting_for_cost_file)
+    await callback.message.edit_text(
+        f"📁 <b>Загружено отчетов:</b> {len(session.main_report_keys)}\n\n"
+        "📊 <b>Отправьте файл с себестоимостью:</b>\n"
+        "• Excel-файл с колонками: <code>Артикул поставщика, Себестоимость</code>"
+    )
+    await callback.answer()
+
+
+@dp.message(
+    StateFilter(
+        AnalyticsState.waiting_for_main_file,
+        AnalyticsState.waiting_for_extra_main_file,
+    ),
+    F.document,
+)
 async def process_main_file(message: Message, state: FSMContext):
     """Обработка основного файла отчета"""
     session = session_manager.get_session(message.from_user.id)
+    merge = (
+        await state.get_state() == AnalyticsState.waiting_for_extra_main_file.state
+        and session.main_partial is not None
+    )
 
     # Валидация файла
     if not FileValidator.validate_file_size(message):
@@ -34,15 +140,25 @@ async def process_main_file(message: Message, state: FSMContext):
     if not FileValidator.validate_file_type(message):
         await message.answer(
             "❌ <b>Неверный формат файла!</b>\n"
-            "Пожалуйста, отправьте файл в формате Excel (.xlsx или .xls)"
+            "Пожалуйста, отправьте файл Excel (.xlsx или .xls), CSV "
+            "или ZIP-архив с ними"
         )
         return
 
+    # Повторно отправленный файл не разбирается второй раз
+    doc = message.document
+    job, started = main_file_jobs.start(
+        message.from_user.id,
+        doc.file_unique_id,
+        lambda: _load_main_partial(doc, message.from_user.id),
+        # Несколько отчетов, присланных подряд, объединяются все
+        queue=merge,
+    )
+    if not started:
+        await message.answer("⏳ Этот файл уже обрабатывается, дождитесь результата.")
+        return
+
     try:
-        # Скачивание и обработка файла
-        doc = message.document
-        file = await bot.get_file(doc.file_id)
-        
         # Для админ-панели
         admin_manager.update_user_activity(
             message.from_user.id,
@@ -53,23 +169,64 @@ async def process_main_file(message: Message, state: FSMContext):
         admin_manager.record_file_processed(message.from_user.id)
 
         async with async_timeout.timeout(Config.PROCESSING_TIMEOUT):
-            file_bytes = BytesIO()
-            await bot.download_file(file.file_path, destination=file_bytes)
-            file_bytes.seek(0)
-
-            # Обработка данных
             processing_msg = await message.answer(
                 "⏳ <b>Обрабатываю основной отчет...</b>"
             )
 
-            session.main_df = DataProcessor.process_main_report(file_bytes)
+            try:
+                partial, content_hash = await job
+            except asyncio.CancelledError:
+                if not main_file_jobs.superseded(message.from_user.id, job):
+                    raise
+                # Пользователь прислал новый файл - результат этого не нужен
+                await processing_msg.edit_text(
+                    "↩️ <b>Обработка отменена:</b> получен новый файл."
+                )
+                return
+
+            if merge and content_hash in session.main_report_keys:
+                await processing_msg.edit_text(
+                    "⚠️ <b>Этот отчет уже добавлен в расчет.</b>\n"
+                    "Отправьте отчет за другой период или файл с себестоимостью.",
+                    reply_markup=KeyboardFactory.get_main_report_keyboard(),
+                )
+                await state.set_state(AnalyticsState.waiting_for_cost_file)
+                return
+
+            # Отчеты за разные периоды складываются по частичным агрегатам,
+            # сырые строки нескольких файлов в памяти не объединяются
+            if merge:
+                partial = await worker_pool.run(
+                    DataProcessor.merge_partials,
+                    session.main_partial,
+                    partial,
+                    owner=message.from_user.id,
+                )
+            main_df = await worker_pool.run(
+                DataProcessor.finalize_main_report,
+                partial,
+                owner=message.from_user.id,
+            )
+            session.main_partial = partial
+            if merge:
+                session.main_report_keys.add(content_hash)
+            else:
+                session.main_report_keys = {content_hash}
+            session.main_df = main_df
             session.update_activity()
 
+            reports_count = len(session.main_report_keys)
             await processing_msg.edit_text(
-                "✅ <b>Основной отчет успешно обработан!</b>\n\n"
-                "📊 <b>Теперь отправьте файл с себестоимостью:</b>\n"
+                (
+                    f"✅ <b>Отчетов объединено:</b> {reports_count}\n\n"
+                    if reports_count > 1
+                    else "✅ <b>Основной отчет успешно обработан!</b>\n\n"
+                )
+                + "📊 <b>Теперь отправьте файл с себестоимостью:</b>\n"
                 "• Excel-файл с колонками: <code>Артикул поставщика, Себестоимость</code>\n"
-                "• Максимальный размер: 10MB"
+                "• Максимальный размер: 10MB\n\n"
+                "Для расчета за месяц или квартал можно добавить отчеты за другие недели.",
+                reply_markup=KeyboardFactory.get_main_report_keyboard(),
             )
 
             await state.set_state(AnalyticsState.waiting_for_cost_file)
@@ -83,8 +240,15 @@ async def process_main_file(message: Message, state: FSMContext):
         logger.error(f"Error processing main file: {e}")
         await message.answer(
             f"❌ <b>Ошибка обработки файла:</b>\n<code>{str(e)}</code>\n\n"
-            "Проверьте, что файл соответствует формату отчетов Wildberries."
+            "Проверьте, что файл соответствует формату отчетов Wildberries.",
+            # Уже загруженные отчеты можно рассчитать без этого файла
+            reply_markup=KeyboardFactory.get_extra_main_report_keyboard()
+            if merge
+            else None,
         )
+    finally:
+        # Разбор не должен продолжаться без ожидающего его обработчика
+        job.cancel()
 
 
 @dp.message(AnalyticsState.waiting_for_cost_file, F.document)
@@ -93,7 +257,14 @@ async def process_cost_file(message: Message, state: FSMContext):
     session = session_manager.get_session(message.from_user.id)
 
     if session.main_df is None:
-        await message.answer("⚠️ Сначала отправьте основной отчет!")
+        await message.answer(
+            "⚠️ Данные анализа выгружены из памяти, отправьте отчеты заново"
+            if session.evicted
+            else "⚠️ Сначала отправьте основной отчет!"
+        )
+        # Без основного отчета следующим ожидается именно он
+        session.reset_analysis()
+        await state.set_state(AnalyticsState.waiting_for_main_file)
         return
 
     # Валидация файла
@@ -108,8 +279,7 @@ async def process_cost_file(message: Message, state: FSMContext):
     try:
         # Скачивание файла
         doc = message.document
-        file = await bot.get_file(doc.file_id)
-        
+
         # Для админ-панели
         admin_manager.update_user_activity(
             message.from_user.id,
@@ -120,17 +290,26 @@ async def process_cost_file(message: Message, state: FSMContext):
         admin_manager.record_file_processed(message.from_user.id)
 
         async with async_timeout.timeout(Config.PROCESSING_TIMEOUT):
-            file_bytes = BytesIO()
-            await bot.download_file(file.file_path, destination=file_bytes)
-            file_bytes.seek(0)
+            file_bytes = await _download_document(doc)
 
             # Обработка данных
             processing_msg = await message.answer(
                 "⏳ <b>Рассчитываю финансовые показатели...</b>"
             )
 
-            session.final_df = DataProcessor.process_cost_data(
-                file_bytes, session.main_df, session.tax_rate
+            # Таблица себестоимости сохраняется для пересчета при смене ставки
+            session.cost_df = await worker_pool.run(
+                DataProcessor.read_cost_table,
+                file_bytes,
+                doc.file_name,
+                owner=message.from_user.id,
+            )
+            session.final_df = await worker_pool.run(
+                DataProcessor.merge_cost_data,
+                session.main_df,
+                session.cost_df,
+                session.tax_rate,
+                owner=message.from_user.id,
             )
             session.update_activity()
 
@@ -141,6 +320,12 @@ async def process_cost_file(message: Message, state: FSMContext):
 
             await state.set_state(AnalyticsState.ready_for_analysis)
 
+        if Config.QUICK_LOOK:
+            await _send_quick_look(message, session)
+        # Задачи пользователя идут в пуле по очереди, поэтому отчеты строятся
+        # после сводки, а не перед ней
+        ReportRenderer.prerender(session)
+
     except asyncio.TimeoutError:
         await message.answer("❌ Превышено время обработки!")
     except Exception as e:
@@ -15,7 +15,7 @@ async def cmd_ref(message: Message):
     global _bot_username
     user_id = message.from_user.id
     # Получаем статистику пользователя: всего приглашено, активных, бонусов
-    total, active, bonus = referral_manager.get_stats(user_id)
+    total, active, bonus = await referral_manager.get_stats(user_id)
 
     # Получаем username бота для формирования ссылки
     if _bot_username is None:
@@ -36,17 +36,16 @@ async def cmd_ref(message: Message):
 async def cmd_activate_me(message: Message):
     """Команда /activate_me – активировать аккаунт и начислить бонус рефереру."""
     user_id = message.from_user.id
-    info = referral_manager.referrals.get(user_id)
+    info = await referral_manager.get_referral(user_id)
 
     if not info:
         await message.answer("ℹ️ У вас нет реферера.")
         return
 
-    if info.get("activated"):
+    # Проверка и отметка активации атомарны: повторная команда бонус не начислит
+    if not await referral_manager.activate_referral(user_id):
         await message.answer("⚠️ Ваш аккаунт уже активирован.")
         return
-
-    referral_manager.activate_referral(user_id)
     await message.answer("✅ Ваш аккаунт активирован! Ваш реферер получил бонус.")
 
 
@@ -68,10 +67,10 @@ async def cmd_reset_referrals(message: Message):
         await message.answer("❌ Неверный формат ID.")
         return
 
-    total, active, bonus = referral_manager.get_stats(referrer_id)
+    total, active, bonus = await referral_manager.get_stats(referrer_id)
     if total == 0 and active == 0 and bonus == 0:
         await message.answer("ℹ️ У пользователя нет данных для сброса.")
         return
 
-    referral_manager.reset_referrals(referrer_id)
+    await referral_manager.reset_referrals(referrer_id)
     await message.answer(f"✅ Начисления пользователя {referrer_id} сброшены.")
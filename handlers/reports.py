@@ -1,7 +1,7 @@
 from aiogram import F
 from aiogram.fsm.context import FSMContext
 from aiogram.types import (
-    BufferedInputFile,
+    FSInputFile,
     Message,
     CallbackQuery,
 )
@@ -9,89 +9,115 @@ from datetime import datetime
 
 from bot.dispatcher import dp
 from services.session_manager import session_manager
-from services.excel_formatter import ExcelFormatter
-from services.report_generator import ReportGenerator
 from keyboards.factories import KeyboardFactory
 from states.analytics import AnalyticsState
+from utils.lazy import LazyImport
 from utils.logger import logger
 
-
-@dp.callback_query(F.data == "get_excel")
-async def send_excel_report(callback: CallbackQuery):
-    """Отправка детального Excel отчета"""
+# Excel и PDF (openpyxl, matplotlib) загружаются при первом запросе отчета
+ReportRenderer = LazyImport("services.report_renderer", "ReportRenderer")
+
+
+# Отчеты анализа: имя файла и тексты сообщений
+REPORTS = {
+    "excel": {
+        "filename": "WB_Analytics_{:%Y%m%d_%H%M}.xlsx",
+        "progress": "⏳ <b>Формирую Excel отчет...</b>",
+        "caption": "📊 <b>Детальный финансовый отчет</b>\n"
+        "• Все финансовые показатели\n"
+        "• Профессиональное форматирование\n"
+        "• Готово для бизнес-анализа",
+        "error": "❌ Ошибка при создании Excel отчета",
+    },
+    "pdf": {
+        "filename": "WB_Summary_{:%Y%m%d_%H%M}.pdf",
+        "progress": "⏳ <b>Формирую PDF отчет...</b>",
+        "caption": "📈 <b>Краткий аналитический отчет</b>\n"
+        "• Визуализация ключевых метрик\n"
+        "• ТОП товары по прибыли\n"
+        "• Распределение доходов",
+        "error": "❌ Ошибка при создании PDF отчета",
+    },
+    "parquet": {
+        "filename": "WB_Analytics_{:%Y%m%d_%H%M}.parquet",
+        "progress": "⏳ <b>Формирую Parquet...</b>",
+        "caption": "🗂 <b>Данные анализа в Parquet</b>\n"
+        "• Все колонки с исходными типами\n"
+        "• Быстрая загрузка в BI и pandas",
+        "error": "❌ Ошибка при создании Parquet файла",
+    },
+}
+
+
+async def _send_report(callback: CallbackQuery, kind: str):
+    """Отправка отчета: из кэша по file_id или с построением и загрузкой"""
     session = session_manager.get_session(callback.from_user.id)
 
     if session.final_df is None:
-        await callback.answer("⚠️ Сначала сформируйте отчет!", show_alert=True)
+        await callback.answer(
+            "⚠️ Данные анализа выгружены из памяти, отправьте отчеты заново"
+            if session.evicted
+            else "⚠️ Сначала сформируйте отчет!",
+            show_alert=True,
+        )
         return
 
-    try:
-        processing_msg = await callback.message.answer(
-            "⏳ <b>Формирую Excel отчет...</b>"
-        )
+    report = REPORTS[kind]
+    version = session.final_version
 
-        # Форматирование и создание Excel
-        excel_file = ExcelFormatter.apply_business_formatting(session.final_df)
-        excel_buffered = BufferedInputFile(
-            excel_file.getvalue(),
-            filename=f"WB_Analytics_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
+    try:
+        # Уже отправленный файл переотправляется по file_id без построения
+        file_id = session.get_artifact(kind, version)
+        if file_id is not None:
+            await callback.message.answer_document(file_id, caption=report["caption"])
+            return
+
+        # Заранее построенный отчет отправляется без сообщения о формировании
+        processing_msg = None
+        if not ReportRenderer.is_ready(session, kind):
+            processing_msg = await callback.message.answer(report["progress"])
+
+        # Файл отправляется с диска по частям, без копии в памяти
+        report_path = await ReportRenderer.render(session, kind)
+        document = FSInputFile(
+            report_path, filename=report["filename"].format(datetime.now())
         )
 
-        await processing_msg.delete()
-        await callback.message.answer_document(
-            excel_buffered,
-            caption="📊 <b>Детальный финансовый отчет</b>\n"
-            "• Все финансовые показатели\n"
-            "• Профессиональное форматирование\n"
-            "• Готово для бизнес-анализа",
+        if processing_msg is not None:
+            await processing_msg.delete()
+        sent = await callback.message.answer_document(
+            document, caption=report["caption"]
         )
+        session.set_artifact(kind, version, sent.document.file_id)
 
     except Exception as e:
-        logger.error(f"Error generating Excel: {e}")
-        await callback.message.answer("❌ Ошибка при создании Excel отчета")
+        logger.error(f"Error generating {kind} report: {e}")
+        await callback.message.answer(report["error"])
+
+
+@dp.callback_query(F.data == "get_excel")
+async def send_excel_report(callback: CallbackQuery):
+    """Отправка детального Excel отчета"""
+    await _send_report(callback, "excel")
 
 
 @dp.callback_query(F.data == "get_pdf")
 async def send_pdf_report(callback: CallbackQuery):
     """Отправка краткого PDF отчета"""
-    session = session_manager.get_session(callback.from_user.id)
-
-    if session.final_df is None:
-        await callback.answer("⚠️ Сначала сформируйте отчет!", show_alert=True)
-        return
-
-    try:
-        processing_msg = await callback.message.answer(
-            "⏳ <b>Формирую PDF отчет...</b>"
-        )
-
-        # Создание PDF
-        pdf_file = ReportGenerator.generate_comprehensive_pdf(session.final_df)
-        pdf_buffered = BufferedInputFile(
-            pdf_file.getvalue(),
-            filename=f"WB_Summary_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf",
-        )
+    await _send_report(callback, "pdf")
 
-        await processing_msg.delete()
-        await callback.message.answer_document(
-            pdf_buffered,
-            caption="📈 <b>Краткий аналитический отчет</b>\n"
-            "• Визуализация ключевых метрик\n"
-            "• ТОП товары по прибыли\n"
-            "• Распределение доходов",
-        )
 
-    except Exception as e:
-        logger.error(f"Error generating PDF: {e}")
-        await callback.message.answer("❌ Ошибка при создании PDF отчета")
+@dp.callback_query(F.data == "get_parquet")
+async def send_parquet_report(callback: CallbackQuery):
+    """Отправка результата анализа в Parquet"""
+    await _send_report(callback, "parquet")
 
 
 @dp.callback_query(F.data == "new_calculation")
 async def new_calculation(callback: CallbackQuery, state: FSMContext):
     """Начать новый расчет"""
     session = session_manager.get_session(callback.from_user.id)
-    session.main_df = None
-    session.final_df = None
+    session.reset_analysis()
 
     await state.set_state(AnalyticsState.waiting_for_tax)
     await callback.message.edit_text(
@@ -22,7 +22,7 @@ async def cmd_start(message: Message, state: FSMContext):
             except ValueError:
                 referrer_id = None
             if referrer_id and referrer_id != message.from_user.id:
-                added = referral_manager.register_referral(
+                added = await referral_manager.register_referral(
                     referrer_id, message.from_user.id
                 )
                 if added:
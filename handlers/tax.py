@@ -1,32 +1,94 @@
 from aiogram import F
+from aiogram.filters import StateFilter
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 
 from bot.dispatcher import dp
-from services.session_manager import session_manager
+from services.session_manager import session_manager, UserSession
+from services.worker_pool import worker_pool
 from keyboards.factories import KeyboardFactory
 from states.analytics import AnalyticsState
+from utils.lazy import LazyImport
+
+DataProcessor = LazyImport("services.data_processor", "DataProcessor")
+ReportRenderer = LazyImport("services.report_renderer", "ReportRenderer")
+
+
+async def _recalculate_tax(session: UserSession, tax_rate: float) -> str:
+    """Пересчет готового анализа под новую ставку без повторной загрузки файлов"""
+    final_df = await worker_pool.run(
+        DataProcessor.apply_tax_rate,
+        session.final_df,
+        tax_rate,
+        owner=session.user_id,
+    )
+    await session_manager.set_tax_rate(session, tax_rate)
+    session.final_df = final_df
+    session.update_activity()
+    ReportRenderer.prerender(session)
+    return (
+        f"✅ <b>Налоговая ставка изменена:</b> {tax_rate}%\n\n"
+        "📈 <b>Доступные отчеты:</b>"
+    )
+
+
+@dp.callback_query(F.data == "change_tax")
+async def change_tax_rate(callback: CallbackQuery, state: FSMContext):
+    """Смена налоговой ставки для готового анализа"""
+    session = session_manager.get_session(callback.from_user.id)
+
+    if session.final_df is None:
+        await callback.answer(
+            "⚠️ Данные анализа выгружены из памяти, отправьте отчеты заново"
+            if session.evicted
+            else "⚠️ Сначала сформируйте отчет!",
+            show_alert=True,
+        )
+        return
+
+    await state.set_state(AnalyticsState.changing_tax)
+    await callback.message.edit_text(
+        f"💵 <b>Текущая налоговая ставка:</b> {session.tax_rate}%\n\n"
+        "📊 Выберите новую налоговую ставку:",
+        reply_markup=KeyboardFactory.get_tax_keyboard(),
+    )
+    await callback.answer()
 
 
 @dp.callback_query(F.data.startswith("tax_"))
 async def process_tax_selection(callback: CallbackQuery, state: FSMContext):
     """Обработчик выбора налоговой ставки"""
     session = session_manager.get_session(callback.from_user.id)
+    recalculate = (
+        await state.get_state() == AnalyticsState.changing_tax.state
+        and session.final_df is not None
+    )
 
     if callback.data == "tax_other":
-        await state.set_state(AnalyticsState.waiting_for_tax)
+        await state.set_state(
+            AnalyticsState.waiting_for_new_tax
+            if recalculate
+            else AnalyticsState.waiting_for_tax
+        )
         await callback.message.edit_text(
             "💵 <b>Введите вашу налоговую ставку в процентах:</b>\n"
             "Например: <code>5.5</code> или <code>6</code>"
         )
+    elif recalculate:
+        tax_rate = float(callback.data.split("_")[1])
+        text = await _recalculate_tax(session, tax_rate)
+        await state.set_state(AnalyticsState.ready_for_analysis)
+        await callback.message.edit_text(
+            text, reply_markup=KeyboardFactory.get_analysis_keyboard()
+        )
     else:
         tax_rate = float(callback.data.split("_")[1])
-        session.tax_rate = tax_rate
+        await session_manager.set_tax_rate(session, tax_rate)
         await state.set_state(AnalyticsState.waiting_for_main_file)
         await callback.message.edit_text(
             f"✅ <b>Налоговая ставка:</b> {tax_rate}%\n\n"
             "📁 <b>Теперь отправьте основной отчет из личного кабинета Wildberries:</b>\n"
-            "• Это должен быть Excel-файл с данными о продажах\n"
+            "• Excel, CSV или ZIP-архив с данными о продажах\n"
             "• Максимальный размер: 10MB",
             reply_markup=None,
         )
@@ -34,7 +96,9 @@ async def process_tax_selection(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@dp.message(AnalyticsState.waiting_for_tax)
+@dp.message(
+    StateFilter(AnalyticsState.waiting_for_tax, AnalyticsState.waiting_for_new_tax)
+)
 async def process_custom_tax(message: Message, state: FSMContext):
     """Обработчик пользовательской налоговой ставки"""
     session = session_manager.get_session(message.from_user.id)
@@ -44,7 +108,18 @@ async def process_custom_tax(message: Message, state: FSMContext):
         if tax_rate <= 0 or tax_rate >= 100:
             raise ValueError
 
-        session.tax_rate = tax_rate
+        if (
+            await state.get_state() == AnalyticsState.waiting_for_new_tax.state
+            and session.final_df is not None
+        ):
+            text = await _recalculate_tax(session, tax_rate)
+            await state.set_state(AnalyticsState.ready_for_analysis)
+            await message.answer(
+                text, reply_markup=KeyboardFactory.get_analysis_keyboard()
+            )
+            return
+
+        await session_manager.set_tax_rate(session, tax_rate)
         await state.set_state(AnalyticsState.waiting_for_main_file)
         await message.answer(
             f"✅ <b>Налоговая ставка установлена:</b> {tax_rate}%\n\n"
@@ -21,6 +21,34 @@ class KeyboardFactory:
             ]
         )
 
+    @staticmethod
+    def get_main_report_keyboard() -> InlineKeyboardMarkup:
+        """Клавиатура после загрузки основного отчета"""
+        return InlineKeyboardMarkup(
+            inline_keyboard=[
+                [
+                    InlineKeyboardButton(
+                        text="➕ Добавить отчет за другой период",
+                        callback_data="add_main_report",
+                    ),
+                ],
+            ]
+        )
+
+    @staticmethod
+    def get_extra_main_report_keyboard() -> InlineKeyboardMarkup:
+        """Клавиатура ожидания дополнительного отчета"""
+        return InlineKeyboardMarkup(
+            inline_keyboard=[
+                [
+                    InlineKeyboardButton(
+                        text="↩️ Перейти к себестоимости",
+                        callback_data="skip_extra_main_report",
+                    ),
+                ],
+            ]
+        )
+
     @staticmethod
     def get_analysis_keyboard() -> InlineKeyboardMarkup:
         """Клавиатура после формирования отчета"""
@@ -35,6 +63,14 @@ class KeyboardFactory:
                     ),
                 ],
                 [
+                    InlineKeyboardButton(
+                        text="🗂 Parquet для BI", callback_data="get_parquet"
+                    ),
+                ],
+                [
+                    InlineKeyboardButton(
+                        text="💵 Изменить ставку", callback_data="change_tax"
+                    ),
                     InlineKeyboardButton(
                         text="🔄 Новый расчет", callback_data="new_calculation"
                     ),
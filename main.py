@@ -1,11 +1,20 @@
 import asyncio
 from bot.bot import bot
 from bot.dispatcher import dp
+from config import Config
 from handlers import register_handlers
+from services.admin_manager import admin_manager
 from services.session_manager import session_manager
+from services.spill import clear_directory
+from services.storage import storage
+from services.worker_pool import worker_pool
+from services.warmup import warm_up
+from utils.lazy import LazyImport
 from utils.logger import logger
 from handlers import referral
 
+ReportRenderer = LazyImport("services.report_renderer", "ReportRenderer")
+
 
 async def main():
     """Основная функция запуска бота"""
@@ -15,19 +24,46 @@ async def main():
 
     logger.info("Starting WB Analytics Bot...")
 
+    loaded = admin_manager.load()
+    logger.info(f"Loaded stats of {loaded} users")
+
+    # Выгруженные данные сессий прошлого запуска больше не нужны
+    clear_directory(Config.SPILL_DIR)
+
     # Запуск фоновых задач
+    asyncio.create_task(session_manager.run_expiry())
     asyncio.create_task(scheduled_cleanup())
+    asyncio.create_task(admin_manager.run_flush())
+    if Config.SESSION_SPILL_AFTER_MINUTES > 0:
+        asyncio.create_task(scheduled_spill())
+    asyncio.create_task(warm_up())
 
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        admin_manager.flush()
+        worker_pool.shutdown()
+        await storage.close()
 
 
 async def scheduled_cleanup():
-    """Регулярная очистка устаревших сессий"""
+    """Регулярная очистка забытых файлов отчетов"""
     while True:
         await asyncio.sleep(3600)
-        cleaned_count = session_manager.cleanup_expired()
-        if cleaned_count > 0:
-            logger.info(f"🧹 Очищено {cleaned_count} устаревших сессий")
+        ReportRenderer.sweep_files()
+
+
+async def scheduled_spill():
+    """Регулярная выгрузка данных простаивающих сессий на диск"""
+    while True:
+        await asyncio.sleep(60)
+        try:
+            spilled = await session_manager.spill_idle()
+        except Exception as e:
+            logger.error(f"Session spill failed: {e}")
+            continue
+        if spilled > 0:
+            logger.info(f"💽 Выгружено на диск {spilled} таблиц сессий")
 
 
 if __name__ == "__main__":
@@ -1,14 +1,26 @@
 import asyncio
 import json
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional, Set
 from dataclasses import dataclass, asdict
-import pandas as pd
+from functools import lru_cache
 
 from config import Config
 from .session_manager import session_manager
+from .stats_store import StatsStore
 from utils.logger import logger
 
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+@lru_cache(maxsize=None)
+def _current_process():
+    """Объект psutil текущего процесса (создается один раз)"""
+    import psutil
+
+    return psutil.Process()
+
 
 @dataclass
 class UserStat:
@@ -33,15 +45,63 @@ class BotStat:
     total_files: int = 0
     memory_usage_mb: float = 0.0
     uptime_days: float = 0.0
+    active_sessions: int = 0
+    sessions_memory_mb: float = 0.0
+    session_evictions: int = 0
+    sessions_expired: int = 0
 
 
 class AdminManager:
-    """Менеджер для админских функций"""
+    """Менеджер для админских функций.
+
+    Статистика обновляется в памяти, а измененные записи периодически
+    сохраняются пачкой в StatsStore (write-behind).
+    """
 
-    def __init__(self):
+    def __init__(self, store: Optional[StatsStore] = None):
         self.user_stats: Dict[int, UserStat] = {}
         self.bot_start_time = datetime.now()
         self.broadcast_messages: List[dict] = []
+        self.store = store
+        self._dirty: Set[int] = set()
+
+    def load(self) -> int:
+        """Загрузка сохраненной статистики при старте бота"""
+        if self.store is None:
+            return 0
+        for record in self.store.load():
+            self.user_stats[record["user_id"]] = UserStat(**record)
+        return len(self.user_stats)
+
+    def _take_dirty(self) -> List[dict]:
+        """Снимок измененных записей для сохранения"""
+        records = [
+            asdict(self.user_stats[user_id])
+            for user_id in self._dirty
+            if user_id in self.user_stats
+        ]
+        self._dirty = set()
+        return records
+
+    def flush(self) -> int:
+        """Синхронное сохранение изменений (при остановке бота)"""
+        if self.store is None:
+            return 0
+        return self.store.save(self._take_dirty())
+
+    async def run_flush(self, interval: float = Config.STATS_FLUSH_SECONDS):
+        """Периодическое сохранение изменений в отдельном потоке"""
+        while True:
+            await asyncio.sleep(interval)
+            if self.store is None or not self._dirty:
+                continue
+            records = self._take_dirty()
+            try:
+                await asyncio.to_thread(self.store.save, records)
+            except Exception as e:
+                # Записи вернутся в буфер, если их не обновили за это время
+                self._dirty.update(record["user_id"] for record in records)
+                logger.error(f"Stats flush failed: {e}")
 
     def update_user_activity(
         self,
@@ -70,11 +130,13 @@ class AdminManager:
             self.user_stats[user_id].first_name = first_name
         if last_name:
             self.user_stats[user_id].last_name = last_name
+        self._dirty.add(user_id)
 
     def record_file_processed(self, user_id: int):
         """Запись обработки файла"""
         if user_id in self.user_stats:
             self.user_stats[user_id].files_processed += 1
+            self._dirty.add(user_id)
 
     def get_bot_stats(self) -> BotStat:
         """Получение общей статистики бота"""
@@ -86,10 +148,7 @@ class AdminManager:
         )
 
         # Примерное использование памяти
-        import psutil
-
-        process = psutil.Process()
-        memory_usage = process.memory_info().rss / 1024 / 1024  # MB
+        memory_usage = _current_process().memory_info().rss / 1024 / 1024  # MB
 
         return BotStat(
             total_users=len(self.user_stats),
@@ -97,13 +156,20 @@ class AdminManager:
             total_files=sum(stat.files_processed for stat in self.user_stats.values()),
             memory_usage_mb=memory_usage,
             uptime_days=(now - self.bot_start_time).total_seconds() / 86400,
+            active_sessions=len(session_manager.sessions),
+            sessions_memory_mb=session_manager.memory_bytes / 1024 / 1024,
+            session_evictions=session_manager.evictions,
+            sessions_expired=session_manager.expired,
         )
 
-    def get_user_stats_df(self) -> pd.DataFrame:
+    def get_user_stats_df(self) -> "pd.DataFrame":
         """Получение статистики пользователей в виде DataFrame"""
-        if not self.user_stats:
-            return pd.DataFrame()
+        import pandas as pd
+
+        return pd.DataFrame(self.get_user_records())
 
+    def get_user_records(self) -> List[dict]:
+        """Статистика пользователей в виде записей (можно передать в пул)"""
         data = []
         for stat in self.user_stats.values():
             data.append(
@@ -122,7 +188,7 @@ class AdminManager:
                 }
             )
 
-        return pd.DataFrame(data)
+        return data
 
     def get_top_users(self, limit: int = 10) -> List[UserStat]:
         """Топ пользователей по активности"""
@@ -174,4 +240,6 @@ class AdminManager:
 
 
 # Глобальный экземпляр менеджера админки
-admin_manager = AdminManager()
+admin_manager = AdminManager(
+    StatsStore(Config.STATS_DB_PATH) if Config.STATS_DB_PATH else None
+)
@@ -1,18 +1,28 @@
 import pandas as pd
 from io import BytesIO
-import matplotlib.pyplot as plt
+import matplotlib
+
+# Без GUI: бот строит графики только в файлы
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
 from datetime import datetime, timedelta
 from typing import List
-from .admin_manager import admin_manager, UserStat
+from .admin_manager import admin_manager, BotStat, UserStat
 
 
 class AdminReporter:
-    """Генератор отчетов для админки"""
+    """Генератор отчетов для админки.
+
+    Excel и графики строятся в пуле по снимку статистики, переданному
+    аргументами: в процессе пула своего admin_manager нет.
+    """
 
     @staticmethod
-    def generate_users_excel() -> BytesIO:
+    def generate_users_excel(
+        records: List[dict], stats: BotStat, top_users: List[UserStat]
+    ) -> BytesIO:
         """Генерация Excel с пользователями"""
-        df = admin_manager.get_user_stats_df()
+        df = pd.DataFrame(records)
 
         if df.empty:
             raise ValueError("Нет данных о пользователях")
@@ -24,7 +34,6 @@ class AdminReporter:
             df.to_excel(writer, sheet_name="Пользователи", index=False)
 
             # Лист с общей статистикой
-            stats = admin_manager.get_bot_stats()
             stats_df = pd.DataFrame(
                 [
                     {"Метрика": "Всего пользователей", "Значение": stats.total_users},
@@ -38,13 +47,25 @@ class AdminReporter:
                         "Метрика": "Использование памяти (MB)",
                         "Значение": f"{stats.memory_usage_mb:.1f}",
                     },
+                    {"Метрика": "Сессий в памяти", "Значение": stats.active_sessions},
+                    {
+                        "Метрика": "Данные сессий (MB)",
+                        "Значение": f"{stats.sessions_memory_mb:.1f}",
+                    },
+                    {
+                        "Метрика": "Выгрузок данных сессий",
+                        "Значение": stats.session_evictions,
+                    },
+                    {
+                        "Метрика": "Истекших сессий",
+                        "Значение": stats.sessions_expired,
+                    },
                 ]
             )
 
             stats_df.to_excel(writer, sheet_name="Статистика", index=False)
 
             # Лист с топ пользователями
-            top_users = admin_manager.get_top_users(20)
             top_data = []
             for user in top_users:
                 top_data.append(
@@ -69,9 +90,9 @@ class AdminReporter:
         return output
 
     @staticmethod
-    def generate_activity_chart() -> BytesIO:
+    def generate_activity_chart(records: List[dict]) -> BytesIO:
         """Генерация графика активности"""
-        df = admin_manager.get_user_stats_df()
+        df = pd.DataFrame(records)
 
         if df.empty:
             raise ValueError("Нет данных для графика")
@@ -80,27 +101,27 @@ class AdminReporter:
         df["last_activity"] = pd.to_datetime(df["last_activity"])
         daily_activity = df.groupby(df["last_activity"].dt.date).size()
 
-        plt.figure(figsize=(12, 6))
+        # Отдельная фигура без pyplot: построение безопасно в потоках пула
+        fig = Figure(figsize=(12, 6))
+        ax1, ax2 = fig.subplots(1, 2)
 
         # График активности
-        plt.subplot(1, 2, 1)
-        daily_activity.tail(14).plot(kind="bar", color="skyblue")  # Последние 14 дней
-        plt.title("Активность по дням (14 дней)")
-        plt.xlabel("Дата")
-        plt.ylabel("Активных пользователей")
-        plt.xticks(rotation=45)
+        recent = daily_activity.tail(14)  # Последние 14 дней
+        ax1.bar([str(day) for day in recent.index], recent.values, color="skyblue")
+        ax1.set_title("Активность по дням (14 дней)")
+        ax1.set_xlabel("Дата")
+        ax1.set_ylabel("Активных пользователей")
+        ax1.tick_params(axis="x", rotation=45)
 
         # Круговая диаграмма по файлам
-        plt.subplot(1, 2, 2)
         file_stats = df["files_processed"].value_counts().head(5)
-        plt.pie(file_stats.values, labels=file_stats.index, autopct="%1.1f%%")
-        plt.title("Распределение по файлам")
+        ax2.pie(file_stats.values, labels=file_stats.index, autopct="%1.1f%%")
+        ax2.set_title("Распределение по файлам")
 
-        plt.tight_layout()
+        fig.tight_layout()
 
         output = BytesIO()
-        plt.savefig(output, format="png", dpi=150, bbox_inches="tight")
-        plt.close()
+        fig.savefig(output, format="png", dpi=150, bbox_inches="tight")
 
         output.seek(0)
         return output
@@ -127,6 +148,9 @@ class AdminReporter:
             f"📊 <b>Файлов на пользователя:</b> {avg_files_per_user:.1f}",
             f"⏰ <b>Аптайм:</b> {stats.uptime_days:.1f} дней",
             f"💾 <b>Память:</b> {stats.memory_usage_mb:.1f} MB",
+            f"🗂 <b>Сессии:</b> {stats.active_sessions}, данные "
+            f"{stats.sessions_memory_mb:.1f} MB, выгрузок {stats.session_evictions}, "
+            f"истекло {stats.sessions_expired}",
             "",
         ]
 
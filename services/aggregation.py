@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Tuple
+
+
+class SkuAggregator:
+    """Агрегаты по артикулам за один проход по кодам факторизации"""
+
+    def __init__(self, df: pd.DataFrame, key: str = "Артикул поставщика"):
+        self.df = df
+        keys = df[key]
+        if (
+            isinstance(keys.dtype, pd.CategoricalDtype)
+            and keys.cat.categories.is_monotonic_increasing
+        ):
+            # Категории с ingest уже отсортированы - коды готовы без факторизации
+            codes = keys.cat.codes.to_numpy()
+            uniques = keys.cat.categories
+        else:
+            codes, uniques = pd.factorize(keys, sort=True)
+        self.codes = codes
+        self.index = pd.Index(uniques, name=key)
+        self.size = len(uniques)
+        # Строки без артикула (код -1) в агрегаты не попадают
+        self._valid = codes >= 0
+        self._masks: Dict[Tuple[str, str], np.ndarray] = {}
+        self._values: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def mask(self, column: str, value: str) -> np.ndarray:
+        """Маска строк, где значение колонки без пробелов равно value"""
+        key = (column, value)
+        if key not in self._masks:
+            values = self.df[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                # Категории уже без пробелов - сравниваются коды, а не строки
+                code = values.cat.categories.get_indexer([value])[0]
+                self._masks[key] = (values.cat.codes == code).to_numpy() & (code >= 0)
+            else:
+                stripped = values.str.strip()
+                self._masks[key] = (stripped == value).to_numpy(dtype=bool)
+        return self._masks[key]
+
+    def count(
+        self, column: Optional[str] = None, mask: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Количество строк (или непустых значений column) по артикулам"""
+        selected = self._select(mask)
+        if column is not None:
+            selected = selected & self._column(column)[1]
+        return np.bincount(self.codes[selected], minlength=self.size)
+
+    def sum(self, column: str, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Сумма значений колонки по артикулам (NaN пропускаются)"""
+        selected = self._select(mask)
+        values = self._column(column)[0]
+        return np.bincount(
+            self.codes[selected], weights=values[selected], minlength=self.size
+        )
+
+    def mean(self, column: str, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Среднее значений колонки по артикулам (NaN, если значений нет)"""
+        counts = self.count(column, mask)
+        sums = self.sum(column, mask)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    def _select(self, mask: Optional[np.ndarray]) -> np.ndarray:
+        """Итоговая маска строк с учетом строк без артикула"""
+        return self._valid if mask is None else self._valid & mask
+
+    def _column(self, column: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Значения колонки с NaN, замененными на 0, и маска непустых значений"""
+        if column not in self._values:
+            values = pd.to_numeric(self.df[column], errors="coerce").to_numpy(
+                dtype=np.float64, na_value=np.nan
+            )
+            present = ~np.isnan(values)
+            self._values[column] = (np.where(present, values, 0.0), present)
+        return self._values[column]
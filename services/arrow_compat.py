@@ -0,0 +1,44 @@
+from typing import List
+
+import pandas as pd
+
+
+def _is_mixed(values) -> bool:
+    """Значения колонки или уровня индекса разных типов (для категорий -
+    разных типов категории)"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.dtype.categories
+    if values.dtype != object:
+        return False
+    return pd.api.types.infer_dtype(values) not in ("string", "empty")
+
+
+def mixed_type_columns(df: pd.DataFrame) -> List[str]:
+    """Колонки, которые Arrow не может сохранить одним типом: артикулы-числа
+    вперемешку со строками, в том числе в виде категорий"""
+    return [name for name in df.columns if _is_mixed(df[name])]
+
+
+def has_mixed_types(df: pd.DataFrame) -> bool:
+    """Есть ли смешанные типы в колонках или в уровнях индекса"""
+    index = df.index
+    return bool(mixed_type_columns(df)) or any(
+        _is_mixed(index.get_level_values(level)) for level in range(index.nlevels)
+    )
+
+
+def stringify_mixed(df: pd.DataFrame) -> pd.DataFrame:
+    """Колонки со смешанными типами - строками (категории остаются категориями)"""
+    mixed = mixed_type_columns(df)
+    if not mixed:
+        return df
+    result = df.copy()
+    for name in mixed:
+        values = result[name]
+        strings = values.astype(object).map(
+            lambda value: None if pd.isna(value) else str(value)
+        )
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            strings = strings.astype("category")
+        result[name] = strings
+    return result
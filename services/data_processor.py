@@ -1,6 +1,9 @@
+import numpy as np
 import pandas as pd
 from io import BytesIO
-from typing import Tuple
+from typing import Iterable, Iterator, Optional
+from .aggregation import SkuAggregator
+from .excel_reader import ExcelReader, MissingColumnsError
 from .validators import FileValidator
 
 
@@ -15,23 +18,92 @@ class DataProcessor:
         "Вайлдберриз реализовал Товар (Пр)",
     ]
 
+    # Колонки основного отчета, которые реально участвуют в расчетах
+    MAIN_NUMERIC_COLUMNS = [
+        "Цена розничная",
+        "Вайлдберриз реализовал Товар (Пр)",
+        "К перечислению Продавцу за реализованный Товар",
+        "Общая сумма штрафов",
+        "Услуги по доставке товара покупателю",
+        "Хранение",
+    ]
+
+    MAIN_REPORT_COLUMNS = [
+        "Артикул поставщика",
+        "Тип документа",
+        "Обоснование для оплаты",
+        "Виды логистики, штрафов и корректировок ВВ",
+    ] + MAIN_NUMERIC_COLUMNS
+
     REQUIRED_COST_COLUMNS = ["Артикул поставщика", "Себестоимость"]
 
     @staticmethod
-    def read_excel_safe(file_bytes: BytesIO) -> pd.DataFrame:
-        """Безопасное чтение Excel файла"""
+    def read_frames_safe(
+        file_bytes: BytesIO,
+        filename: str,
+        columns: Iterable[str],
+        numeric_columns: Iterable[str] = (),
+        required: Iterable[str] = (),
+        missing_message: str = "Отсутствуют обязательные колонки: {}",
+    ) -> Iterator[pd.DataFrame]:
+        """Безопасное потоковое чтение отчета (Excel, CSV или ZIP с ними).
+
+        Заголовки проверяются на наличие колонок required до чтения данных.
+        """
         try:
-            return pd.read_excel(file_bytes, engine="openpyxl")
-        except Exception as e:
+            yield from ExcelReader.iter_frames(
+                file_bytes, filename, columns, numeric_columns, required
+            )
+        except MissingColumnsError as e:
+            raise ValueError(missing_message.format(e.missing)) from e
+        except UnicodeDecodeError as e:
+            # Тоже ValueError, но его текст пользователю ничего не скажет
             raise ValueError(
-                "Невозможно прочитать Excel файл. Проверьте формат."
+                "Невозможно прочитать CSV: сохраните файл в кодировке UTF-8 "
+                "или Windows-1251."
             ) from e
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError("Невозможно прочитать файл. Проверьте формат.") from e
 
     @staticmethod
-    def process_main_report(file_bytes: BytesIO) -> pd.DataFrame:
+    def process_main_report(
+        file_bytes: BytesIO, filename: str = "report.xlsx"
+    ) -> pd.DataFrame:
         """Обработка основного отчета с оптимизацией"""
-        df = DataProcessor.read_excel_safe(file_bytes)
+        partial = DataProcessor.aggregate_main_report(file_bytes, filename)
+        return DataProcessor.finalize_main_report(partial)
+
+    @staticmethod
+    def aggregate_main_report(
+        file_bytes: BytesIO, filename: str = "report.xlsx"
+    ) -> pd.DataFrame:
+        """Свертка основного отчета в частичные агрегаты по артикулам.
+
+        Частичные агрегаты содержат только суммы и количества, поэтому отчеты
+        за разные периоды объединяются сложением (merge_partials), а средние
+        считаются один раз в finalize_main_report. Файлы из ZIP-архива и блоки
+        строк CSV сворачиваются по мере чтения.
+        """
+        partial = None
+        for df in DataProcessor.read_frames_safe(
+            file_bytes,
+            filename,
+            DataProcessor.MAIN_REPORT_COLUMNS,
+            DataProcessor.MAIN_NUMERIC_COLUMNS,
+            DataProcessor.REQUIRED_MAIN_COLUMNS,
+        ):
+            partial = DataProcessor.merge_partials(
+                partial, DataProcessor._aggregate_frame(df)
+            )
+        if partial is None:
+            raise ValueError("Файл не содержит данных")
+        return partial
 
+    @staticmethod
+    def _aggregate_frame(df: pd.DataFrame) -> pd.DataFrame:
+        """Частичные агрегаты по одной части отчета"""
         # Валидация колонок
         is_valid, missing_cols = FileValidator.validate_columns(
             df, DataProcessor.REQUIRED_MAIN_COLUMNS
@@ -41,91 +113,99 @@ class DataProcessor:
 
         # Предварительная обработка
         df = df[df["Артикул поставщика"].notna()]
-        df = df.copy()
-
-        # Создаем маски для фильтрации
-        sales_mask = df["Тип документа"].str.strip() == "Продажа"
-        logistics_mask = df["Обоснование для оплаты"].str.strip() == "Логистика"
-        promo_mask = (
-            df["Виды логистики, штрафов и корректировок ВВ"].str.strip()
-            == "Оказание услуг «WB Продвижение»"
-        )
+        agg = SkuAggregator(df)
 
-        # Основные агрегации для продаж
-        sales_data = (
-            df[sales_mask]
-            .groupby("Артикул поставщика")
-            .agg(
-                {
-                    "Цена розничная": ["count", "mean", "sum"],
-                    "Вайлдберриз реализовал Товар (Пр)": "mean",
-                    "К перечислению Продавцу за реализованный Товар": "sum",
-                    "Общая сумма штрафов": "sum",
-                }
-            )
-            .round(2)
+        # Маски строятся один раз на весь расчет
+        sales_mask = agg.mask("Тип документа", "Продажа")
+        logistics_mask = agg.mask("Обоснование для оплаты", "Логистика")
+        promo_mask = agg.mask(
+            "Виды логистики, штрафов и корректировок ВВ",
+            "Оказание услуг «WB Продвижение»",
         )
 
-        # Переименование колонок
-        sales_data.columns = [
-            "Количество продаж",
-            "Средняя цена розничная",
-            "Выручка",
-            "Среднее Вайлдберриз",
-            "Сумма к перечислению",
-            "Сумма штрафов",
-        ]
-
-        # Дополнительные агрегации
-        logistics_data = (
-            df[logistics_mask]
-            .groupby("Артикул поставщика")["Услуги по доставке товара покупателю"]
-            .sum()
-            .round(2)
-            .rename("Сумма услуг доставки")
+        return pd.DataFrame(
+            {
+                "Строк продаж": agg.count(mask=sales_mask),
+                "Количество продаж": agg.count("Цена розничная", sales_mask),
+                "Выручка": agg.sum("Цена розничная", sales_mask),
+                "Количество Вайлдберриз": agg.count(
+                    "Вайлдберриз реализовал Товар (Пр)", sales_mask
+                ),
+                "Сумма Вайлдберриз": agg.sum(
+                    "Вайлдберриз реализовал Товар (Пр)", sales_mask
+                ),
+                "Сумма к перечислению": agg.sum(
+                    "К перечислению Продавцу за реализованный Товар", sales_mask
+                ),
+                "Сумма услуг доставки": agg.sum(
+                    "Услуги по доставке товара покупателю", logistics_mask
+                ),
+                "Сумма штрафов": agg.sum("Общая сумма штрафов", sales_mask),
+                "Хранение": agg.sum("Хранение"),
+                "Сумма WB Продвижение": agg.sum(
+                    "Вайлдберриз реализовал Товар (Пр)", promo_mask
+                ),
+            },
+            index=agg.index,
         )
 
-        storage_data = (
-            df.groupby("Артикул поставщика")["Хранение"]
-            .sum()
-            .round(2)
-            .rename("Хранение")
-        )
+    @staticmethod
+    def merge_partials(
+        left: Optional[pd.DataFrame], right: pd.DataFrame
+    ) -> pd.DataFrame:
+        """Объединение частичных агрегатов двух отчетов"""
+        if left is None:
+            return right
+        return left.add(right, fill_value=0)
 
-        promo_data = (
-            df[promo_mask]
-            .groupby("Артикул поставщика")["Вайлдберриз реализовал Товар (Пр)"]
-            .sum()
-            .round(2)
-            .rename("Сумма WB Продвижение")
-        )
+    @staticmethod
+    def finalize_main_report(partial: pd.DataFrame) -> pd.DataFrame:
+        """Расчет итоговых показателей из частичных агрегатов"""
+        # В отчет попадают только артикулы с продажами
+        partial = partial[partial["Строк продаж"] > 0]
 
-        # Объединение всех данных
-        result = sales_data.join(
-            [logistics_data, storage_data, promo_data], how="left"
-        ).fillna(0)
-
-        # Реорганизация колонок
-        column_order = [
-            "Количество продаж",
-            "Средняя цена розничная",
-            "Выручка",
-            "Среднее Вайлдберриз",
-            "Сумма к перечислению",
-            "Сумма услуг доставки",
-            "Сумма штрафов",
-            "Хранение",
-            "Сумма WB Продвижение",
-        ]
-
-        return result[column_order]
+        sales_count = partial["Количество продаж"]
+        wb_count = partial["Количество Вайлдберриз"]
+
+        result = pd.DataFrame(
+            {
+                "Количество продаж": sales_count.astype("int32"),
+                "Средняя цена розничная": partial["Выручка"]
+                / sales_count.where(sales_count > 0),
+                "Выручка": partial["Выручка"],
+                "Среднее Вайлдберриз": partial["Сумма Вайлдберриз"]
+                / wb_count.where(wb_count > 0),
+                "Сумма к перечислению": partial["Сумма к перечислению"],
+                "Сумма услуг доставки": partial["Сумма услуг доставки"],
+                "Сумма штрафов": partial["Сумма штрафов"],
+                "Хранение": partial["Хранение"],
+                "Сумма WB Продвижение": partial["Сумма WB Продвижение"],
+            }
+        )
+        result = result.fillna(0).round(2)
+        # Артикулы в итогах уникальны, категории для них не выгоднее строк;
+        # сжимаются только счетчики, деньги остаются в float64
+        return ExcelReader.compact_frame(result, result.columns, floats=False)
 
     @staticmethod
-    def process_cost_data(
-        cost_file_bytes: BytesIO, main_df: pd.DataFrame, tax_rate: float
+    def read_cost_table(
+        cost_file_bytes: BytesIO, filename: str = "cost.xlsx"
     ) -> pd.DataFrame:
-        """Обработка данных себестоимости"""
-        df_cost = DataProcessor.read_excel_safe(cost_file_bytes)
+        """Чтение и проверка файла себестоимости"""
+        frames = list(
+            DataProcessor.read_frames_safe(
+                cost_file_bytes,
+                filename,
+                DataProcessor.REQUIRED_COST_COLUMNS,
+                ["Себестоимость"],
+                DataProcessor.REQUIRED_COST_COLUMNS,
+                "В файле себестоимости отсутствуют колонки: {}",
+            )
+        )
+        df_cost = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        if len(frames) > 1:
+            # У частей архива разные наборы категорий, после concat - object
+            df_cost = ExcelReader.compact_frame(df_cost, ["Себестоимость"])
 
         # Валидация колонок
         is_valid, missing_cols = FileValidator.validate_columns(
@@ -136,19 +216,52 @@ class DataProcessor:
                 f"В файле себестоимости отсутствуют колонки: {missing_cols}"
             )
 
-        # Объединение данных
+        return df_cost[DataProcessor.REQUIRED_COST_COLUMNS]
+
+    @staticmethod
+    def process_cost_data(
+        cost_file_bytes: BytesIO,
+        main_df: pd.DataFrame,
+        tax_rate: float,
+        filename: str = "cost.xlsx",
+    ) -> pd.DataFrame:
+        """Обработка данных себестоимости"""
+        df_cost = DataProcessor.read_cost_table(cost_file_bytes, filename)
+        return DataProcessor.merge_cost_data(main_df, df_cost, tax_rate)
+
+    @staticmethod
+    def merge_cost_data(
+        main_df: pd.DataFrame, df_cost: pd.DataFrame, tax_rate: float
+    ) -> pd.DataFrame:
+        """Объединение отчета с себестоимостью и расчет показателей"""
         merged = pd.merge(
             main_df,
             df_cost[["Артикул поставщика", "Себестоимость"]],
             on="Артикул поставщика",
             how="left",
-        ).fillna(0)
+        )
+        # Пустые значения появляются только у артикулов без себестоимости;
+        # на входе себестоимость может быть float32, расчеты ведутся в float64
+        merged["Себестоимость"] = merged["Себестоимость"].fillna(0).astype(np.float64)
 
         # Расчет финансовых показателей
         merged["Итоговая себестоимость"] = (
             merged["Себестоимость"] * merged["Количество продаж"]
         ).round(2)
 
+        DataProcessor._calculate_tax_dependent(merged, tax_rate)
+        return ExcelReader.compact_frame(merged, merged.columns, floats=False)
+
+    @staticmethod
+    def apply_tax_rate(final_df: pd.DataFrame, tax_rate: float) -> pd.DataFrame:
+        """Пересчет показателей, зависящих от налоговой ставки, без перечитывания файлов"""
+        result = final_df.copy()
+        DataProcessor._calculate_tax_dependent(result, tax_rate)
+        return result
+
+    @staticmethod
+    def _calculate_tax_dependent(merged: pd.DataFrame, tax_rate: float) -> None:
+        """Расчет налогов, чистой прибыли, маржинальности и рентабельности"""
         merged["Налоги"] = (merged["Сумма к перечислению"] * (tax_rate / 100)).round(2)
 
         # Расчет чистой прибыли
@@ -170,5 +283,3 @@ class DataProcessor:
         merged["Рентабельность"] = (
             merged["Чистая прибыль"] / merged["Итоговая себестоимость"].replace(0, 1)
         ).round(4)
-
-        return merged
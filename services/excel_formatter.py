@@ -1,88 +1,142 @@
 import pandas as pd
+from copy import copy
 from io import BytesIO
-from openpyxl.styles import Alignment, Border, Side, Font, PatternFill
+from typing import BinaryIO, List, Optional
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Side, Font, NamedStyle, PatternFill
+from openpyxl.styles.fonts import DEFAULT_FONT
 from openpyxl.formatting.rule import ColorScaleRule
 from openpyxl.utils import get_column_letter
+from .aggregation import SkuAggregator
+from .data_processor import DataProcessor
+from .excel_reader import ExcelReader
 
 
 class ExcelFormatter:
     """Класс для профессионального форматирования Excel с распределением затрат"""
 
-    @staticmethod
-    def apply_business_formatting(df: pd.DataFrame) -> BytesIO:
-        """Применение бизнес-форматирования к отчету"""
-        output = BytesIO()
-
-        with pd.ExcelWriter(output, engine="openpyxl") as writer:
-            df.to_excel(writer, index=False, sheet_name="Аналитика")
-            workbook = writer.book
-            worksheet = writer.sheets["Аналитика"]
-
-            # Стили форматирования
-            thin_border = Border(
-                left=Side(style="thin"),
-                right=Side(style="thin"),
-                top=Side(style="thin"),
-                bottom=Side(style="thin"),
-            )
+    SHEET_NAME = "Аналитика"
 
-            center_alignment = Alignment(horizontal="center", vertical="center")
+    # Определение типов колонок
+    FINANCIAL_COLUMNS = frozenset(
+        [
+            "Средняя цена розничная",
+            "Среднее Вайлдберриз",
+            "Выручка",
+            "Сумма к перечислению",
+            "Сумма услуг доставки",
+            "Сумма штрафов",
+            "Хранение",
+            "Сумма WB Продвижение",
+            "Платная приемка",
+            "Налоги",
+            "Себестоимость",
+            "Итоговая себестоимость",
+            "Чистая прибыль",
+        ]
+    )
 
-            # Форматирование заголовков
-            for cell in worksheet[1]:
-                cell.alignment = center_alignment
-                cell.font = Font(bold=True)
-                cell.border = thin_border
-                cell.fill = PatternFill(
-                    start_color="2E86AB", end_color="2E86AB", fill_type="solid"
-                )
-                cell.font = Font(color="FFFFFF", bold=True)
-
-            # Определение типов колонок
-            financial_columns = [
-                "Средняя цена розничная",
-                "Среднее Вайлдберриз",
-                "Выручка",
-                "Сумма к перечислению",
-                "Сумма услуг доставки",
-                "Сумма штрафов",
-                "Хранение",
-                "Сумма WB Продвижение",
-                "Платная приемка",
-                "Налоги",
-                "Себестоимость",
-                "Итоговая себестоимость",
-                "Чистая прибыль",
-            ]
-
-            percent_columns = ["Маржинальность", "Рентабельность"]
-
-            # Форматирование данных
-            for row in worksheet.iter_rows(min_row=2, max_row=worksheet.max_row):
-                for cell in row:
-                    cell.alignment = center_alignment
-                    cell.border = thin_border
-
-                    # Форматирование финансовых колонок
-                    column_name = (
-                        df.columns[cell.column - 1]
-                        if cell.column <= len(df.columns)
-                        else None
-                    )
-                    if column_name in financial_columns:
-                        cell.number_format = '#,##0.00" ₽"'
-                    elif column_name in percent_columns:
-                        cell.number_format = "0.00%"
-
-            # Условное форматирование
-            ExcelFormatter._apply_conditional_formatting(worksheet, df)
-
-            # Автоматическая ширина колонок
-            ExcelFormatter._auto_adjust_columns(worksheet)
+    PERCENT_COLUMNS = frozenset(["Маржинальность", "Рентабельность"])
+
+    @staticmethod
+    def apply_business_formatting(
+        df: pd.DataFrame, output: Optional[BinaryIO] = None
+    ) -> BinaryIO:
+        """Применение бизнес-форматирования к отчету.
+
+        Книга пишется потоково (write-only): стиль каждой колонки определяется
+        один раз, а строки уходят в файл сразу, без хранения листа в памяти.
+        Без output результат собирается в BytesIO.
+        """
+        output = output if output is not None else BytesIO()
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet(ExcelFormatter.SHEET_NAME)
+        for style in ExcelFormatter._named_styles():
+            workbook.add_named_style(style)
+
+        # Значения по колонкам: NaN - пустая ячейка, numpy-типы - Python-типы
+        columns = [
+            df[name].astype(object).where(df[name].notna(), None).tolist()
+            for name in df.columns
+        ]
 
+        # Ширина задается до первой строки - потом колонки уже записаны
+        ExcelFormatter._auto_adjust_columns(worksheet, df)
+
+        header = []
+        for name in df.columns:
+            cell = WriteOnlyCell(worksheet, value=name)
+            cell.style = "header"
+            header.append(cell)
+        worksheet.append(header)
+
+        # Одна ячейка-шаблон на колонку: строка сериализуется сразу при
+        # append, поэтому ячейки можно переиспользовать для следующей строки
+        cells = []
+        for name in df.columns:
+            cell = WriteOnlyCell(worksheet)
+            cell.style = ExcelFormatter._column_style(name)
+            cells.append(cell)
+
+        for values in zip(*columns):
+            for cell, value in zip(cells, values):
+                cell.value = value
+            worksheet.append(cells)
+
+        # Условное форматирование
+        ExcelFormatter._apply_conditional_formatting(worksheet, df)
+
+        workbook.save(output)
         output.seek(0)
         return output
 
+    @staticmethod
+    def _named_styles() -> List[NamedStyle]:
+        """Именованные стили отчета: заголовок, текст, деньги, проценты"""
+        thin_border = Border(
+            left=Side(style="thin"),
+            right=Side(style="thin"),
+            top=Side(style="thin"),
+            bottom=Side(style="thin"),
+        )
+        center_alignment = Alignment(horizontal="center", vertical="center")
+
+        header = NamedStyle(
+            name="header",
+            font=Font(color="FFFFFF", bold=True),
+            fill=PatternFill(
+                start_color="2E86AB", end_color="2E86AB", fill_type="solid"
+            ),
+            border=thin_border,
+            alignment=center_alignment,
+        )
+        styles = [header]
+        for name, number_format in (
+            ("data", "General"),
+            ("money", '#,##0.00" ₽"'),
+            ("percent", "0.00%"),
+        ):
+            styles.append(
+                NamedStyle(
+                    name=name,
+                    font=copy(DEFAULT_FONT),
+                    border=thin_border,
+                    alignment=center_alignment,
+                    number_format=number_format,
+                )
+            )
+        return styles
+
+    @staticmethod
+    def _column_style(column_name: str) -> str:
+        """Имя стиля ячеек колонки"""
+        if column_name in ExcelFormatter.FINANCIAL_COLUMNS:
+            return "money"
+        if column_name in ExcelFormatter.PERCENT_COLUMNS:
+            return "percent"
+        return "data"
+
     @staticmethod
     def _apply_conditional_formatting(worksheet, df):
         """Применение условного форматирования"""
@@ -102,25 +156,41 @@ class ExcelFormatter:
                 end_color="63BE7B",
             )
             worksheet.conditional_formatting.add(
-                f"{col_letter}2:{col_letter}{worksheet.max_row}", rule
+                f"{col_letter}2:{col_letter}{len(df) + 1}", rule
             )
 
     @staticmethod
-    def _auto_adjust_columns(worksheet):
-        """Автоматическая настройка ширины колонок"""
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
+    def _auto_adjust_columns(worksheet, df: pd.DataFrame):
+        """Автоматическая настройка ширины колонок по данным DataFrame.
 
+        Ячейки листа не читаются: ширина считается до записи, поэтому работает
+        и для потоковой (write-only) книги.
+        """
+        for idx, name in enumerate(df.columns, start=1):
+            max_length = max(len(str(name)), ExcelFormatter._text_width(df[name]))
             adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
+            worksheet.column_dimensions[get_column_letter(idx)].width = adjusted_width
+
+    @staticmethod
+    def _text_width(values: pd.Series) -> int:
+        """Длина самого длинного отображаемого значения колонки"""
+        values = values.dropna()
+        if values.empty:
+            return 0
+
+        style = ExcelFormatter._column_style(values.name)
+        if style != "data" or pd.api.types.is_integer_dtype(values):
+            # Длина числа в фиксированном формате растет с модулем, поэтому
+            # достаточно отформатировать минимум и максимум
+            pattern = {"money": "{:,.2f} ₽", "percent": "{:.2%}"}.get(style, "{}")
+            return max(
+                len(pattern.format(value)) for value in (values.min(), values.max())
+            )
+
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Для категорий достаточно длин самих категорий
+            values = values.cat.remove_unused_categories().cat.categories.to_series()
+        return int(values.astype(str).str.len().max())
 
 
 class CostDistributor:
@@ -180,8 +250,11 @@ class AdvancedReportProcessor:
     @staticmethod
     def process_main_report(file_bytes: BytesIO) -> pd.DataFrame:
         """Обработка основного отчета с учетом распределения затрат"""
-        df = pd.read_excel(file_bytes, engine="openpyxl")
-        df.columns = df.columns.str.strip()
+        df = ExcelReader.read_columns(
+            file_bytes,
+            DataProcessor.MAIN_REPORT_COLUMNS,
+            DataProcessor.MAIN_NUMERIC_COLUMNS,
+        )
 
         # Проверяем наличие необходимых колонок
         required_columns = ["Артикул поставщика", "Тип документа"]
@@ -190,121 +263,50 @@ class AdvancedReportProcessor:
                 raise ValueError(f"Отсутствует обязательная колонка: {col}")
 
         df = df[df["Артикул поставщика"].notna()]
+        agg = SkuAggregator(df)
 
-        # Продажи
-        sales = df[df["Тип документа"].str.strip() == "Продажа"]
-        sales_count = (
-            sales.groupby("Артикул поставщика")
-            .size()
-            .reset_index(name="Количество продаж")
-        )
-
-        # Логистика
-        logistics = df[df["Обоснование для оплаты"].str.strip() == "Логистика"]
-        logistics_count = (
-            logistics.groupby("Артикул поставщика")
-            .size()
-            .reset_index(name="Количество доставок")
-        )
-
-        # Средние значения
-        avg_price = (
-            sales.groupby("Артикул поставщика")["Цена розничная"]
-            .mean()
-            .reset_index(name="Средняя цена розничная")
-        )
-        avg_wb = (
-            sales.groupby("Артикул поставщика")["Вайлдберриз реализовал Товар (Пр)"]
-            .mean()
-            .reset_index(name="Среднее Вайлдберриз")
-        )
-
-        # Суммы
-        sum_payment = (
-            sales.groupby("Артикул поставщика")[
-                "К перечислению Продавцу за реализованный Товар"
-            ]
-            .sum()
-            .reset_index(name="Сумма к перечислению")
-        )
-        sum_delivery = (
-            logistics.groupby("Артикул поставщика")[
-                "Услуги по доставке товара покупателю"
-            ]
-            .sum()
-            .reset_index(name="Сумма услуг доставки")
-        )
-        sum_fines = (
-            sales.groupby("Артикул поставщика")["Общая сумма штрафов"]
-            .sum()
-            .reset_index(name="Сумма штрафов")
-        )
-
-        # Хранение (пока собираем общую сумму, потом распределим)
-        storage_total = df.groupby("Артикул поставщика")["Хранение"].sum().reset_index()
-
-        # WB Продвижение (пока собираем общую сумму, потом распределим)
-        wb_promo = df[
-            df["Виды логистики, штрафов и корректировок ВВ"].str.strip()
-            == "Оказание услуг «WB Продвижение»"
-        ]
-        wb_promo_sum = (
-            wb_promo.groupby("Артикул поставщика")["Вайлдберриз реализовал Товар (Пр)"]
-            .sum()
-            .reset_index(name="Сумма WB Продвижение")
+        sales_mask = agg.mask("Тип документа", "Продажа")
+        logistics_mask = agg.mask("Обоснование для оплаты", "Логистика")
+        promo_mask = agg.mask(
+            "Виды логистики, штрафов и корректировок ВВ",
+            "Оказание услуг «WB Продвижение»",
         )
+        paid_acceptance_mask = agg.mask("Обоснование для оплаты", "Платная приемка")
+
+        columns = {
+            "Количество продаж": agg.count(mask=sales_mask),
+            "Количество доставок": agg.count(mask=logistics_mask),
+            "Средняя цена розничная": agg.mean("Цена розничная", sales_mask),
+            "Среднее Вайлдберриз": agg.mean(
+                "Вайлдберриз реализовал Товар (Пр)", sales_mask
+            ),
+            "Выручка": agg.sum("Цена розничная", sales_mask),
+            "Сумма к перечислению": agg.sum(
+                "К перечислению Продавцу за реализованный Товар", sales_mask
+            ),
+            "Сумма услуг доставки": agg.sum(
+                "Услуги по доставке товара покупателю", logistics_mask
+            ),
+            "Сумма штрафов": agg.sum("Общая сумма штрафов", sales_mask),
+            # Хранение и WB Продвижение собираем целиком, потом распределим
+            "Хранение": agg.sum("Хранение"),
+            "Сумма WB Продвижение": agg.sum(
+                "Вайлдберриз реализовал Товар (Пр)", promo_mask
+            ),
+        }
 
         # Платная приемка (если есть в данных)
-        paid_acceptance = df[
-            df["Обоснование для оплаты"].str.strip() == "Платная приемка"
-        ]
-        paid_acceptance_sum = (
-            paid_acceptance.groupby("Артикул поставщика")[
-                "Услуги по доставке товара покупателю"
-            ]
-            .sum()
-            .reset_index(name="Платная приемка")
-        )
-
-        # Собираем базовый результат
-        result = (
-            sales_count.merge(logistics_count, on="Артикул поставщика", how="left")
-            .merge(avg_price, on="Артикул поставщика", how="left")
-            .merge(avg_wb, on="Артикул поставщика", how="left")
-            .merge(sum_payment, on="Артикул поставщика", how="left")
-            .merge(sum_delivery, on="Артикул поставщика", how="left")
-            .merge(sum_fines, on="Артикул поставщика", how="left")
-            .merge(storage_total, on="Артикул поставщика", how="left")
-            .merge(wb_promo_sum, on="Артикул поставщика", how="left")
-        )
-
-        # Добавляем платную приемку если есть данные
-        if not paid_acceptance_sum.empty:
-            result = result.merge(
-                paid_acceptance_sum, on="Артикул поставщика", how="left"
+        if paid_acceptance_mask.any():
+            columns["Платная приемка"] = agg.sum(
+                "Услуги по доставке товара покупателю", paid_acceptance_mask
             )
 
-        # Выручка
-        revenue = (
-            sales.groupby("Артикул поставщика")["Цена розничная"]
-            .sum()
-            .reset_index(name="Выручка")
-        )
-        result = result.merge(revenue, on="Артикул поставщика", how="left")
-
-        result.fillna(0, inplace=True)
+        result = pd.DataFrame(columns, index=agg.index)
+        result = result[columns["Количество продаж"] > 0].fillna(0).reset_index()
 
         # Распределяем затраты пропорционально количеству продаж
         result = CostDistributor.distribute_costs(result)
 
-        # Переупорядочиваем колонки
-        cols = list(result.columns)
-        if "Выручка" in cols and "Сумма к перечислению" in cols:
-            cols.insert(
-                cols.index("Сумма к перечислению"), cols.pop(cols.index("Выручка"))
-            )
-            result = result[cols]
-
         return result
 
     @staticmethod
@@ -312,8 +314,9 @@ class AdvancedReportProcessor:
         file_bytes: BytesIO, main_df: pd.DataFrame, tax_rate: float
     ) -> pd.DataFrame:
         """Обработка себестоимости с учетом распределенных затрат"""
-        df_cost = pd.read_excel(file_bytes, engine="openpyxl")
-        df_cost.columns = df_cost.columns.str.strip()
+        df_cost = ExcelReader.read_columns(
+            file_bytes, DataProcessor.REQUIRED_COST_COLUMNS, ["Себестоимость"]
+        )
 
         if (
             "Артикул поставщика" not in df_cost.columns
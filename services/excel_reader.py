@@ -0,0 +1,601 @@
+import codecs
+import csv
+import io
+import os
+import shutil
+import time
+import zipfile
+from operator import itemgetter
+from tempfile import SpooledTemporaryFile
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Set
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from config import Config
+from utils.logger import logger
+
+
+class MissingColumnsError(ValueError):
+    """В заголовке отчета нет обязательных колонок"""
+
+    def __init__(self, missing: List[str]):
+        super().__init__(missing)
+        self.missing = missing
+
+    def __str__(self) -> str:
+        return f"Отсутствуют обязательные колонки: {self.missing}"
+
+
+class ExcelReader:
+    """Потоковое чтение отчетов (Excel, CSV или ZIP с ними) только нужных колонок"""
+
+    # Сколько строк копится в Python-объектах до перевода в numpy-массивы
+    CHUNK_SIZE = 50_000
+
+    # Файлы из архива больше этого размера распаковываются во временный файл на диске
+    SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+    # По началу CSV такого размера определяется кодировка
+    CSV_SNIFF_SIZE = 64 * 1024
+
+    _NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+    _REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+    @staticmethod
+    def detect_format(file_bytes: IO[bytes], filename: str = "") -> str:
+        """Определение формата по сигнатуре файла: xlsx, xls, zip или csv"""
+        head = file_bytes.read(8)
+        file_bytes.seek(0)
+        if head.startswith(b"\xd0\xcf\x11\xe0"):
+            return "xls"
+        if head.startswith(b"PK\x03\x04"):
+            # xlsx тоже zip-архив, отличаем его по служебному файлу OOXML
+            with zipfile.ZipFile(file_bytes) as archive:
+                names = set(archive.namelist())
+            file_bytes.seek(0)
+            return "xlsx" if "[Content_Types].xml" in names else "zip"
+
+        extension = os.path.splitext(filename or "")[1].lower()
+        return "xls" if extension == ".xls" else "csv"
+
+    @staticmethod
+    def iter_frames(
+        file_bytes: IO[bytes],
+        filename: str,
+        columns: Iterable[str],
+        numeric_columns: Iterable[str] = (),
+        required: Iterable[str] = (),
+    ) -> Iterator[pd.DataFrame]:
+        """Чтение отчета частями: по файлу архива или по блоку строк CSV"""
+        file_format = ExcelReader.detect_format(file_bytes, filename)
+        if file_format == "zip":
+            yield from ExcelReader._iter_zip(
+                file_bytes, columns, numeric_columns, required
+            )
+        elif file_format == "csv":
+            yield from ExcelReader.iter_csv(
+                file_bytes, columns, numeric_columns, required
+            )
+        else:
+            yield ExcelReader.read_columns(
+                file_bytes, columns, numeric_columns, file_format, required
+            )
+
+    @staticmethod
+    def _iter_zip(
+        file_bytes: IO[bytes],
+        columns: Iterable[str],
+        numeric_columns: Iterable[str],
+        required: Iterable[str],
+    ) -> Iterator[pd.DataFrame]:
+        """Потоковая распаковка отчетов из ZIP-архива по одному файлу"""
+        with zipfile.ZipFile(file_bytes) as archive:
+            members = sorted(
+                (
+                    info
+                    for info in archive.infolist()
+                    if not info.is_dir()
+                    and not info.filename.startswith("__MACOSX/")
+                    and not os.path.basename(info.filename).startswith(".")
+                    and info.filename.lower().endswith((".xlsx", ".xls", ".csv"))
+                ),
+                key=lambda info: info.filename,
+            )
+            if not members:
+                raise ValueError("В архиве нет файлов Excel или CSV")
+            if sum(info.file_size for info in members) > Config.MAX_UNPACKED_SIZE:
+                raise ValueError("Архив слишком большой после распаковки")
+
+            for info in members:
+                with archive.open(info) as member:
+                    if info.filename.lower().endswith(".csv"):
+                        yield from ExcelReader.iter_csv(
+                            member, columns, numeric_columns, required
+                        )
+                        continue
+
+                    # Excel требует произвольного доступа к файлу,
+                    # поэтому распаковывается потоком во временный файл
+                    with SpooledTemporaryFile(
+                        max_size=ExcelReader.SPOOL_MAX_SIZE
+                    ) as spool:
+                        shutil.copyfileobj(member, spool, 1024 * 1024)
+                        spool.seek(0)
+                        yield ExcelReader.read_columns(
+                            spool, columns, numeric_columns, required=required
+                        )
+
+    @staticmethod
+    def iter_csv(
+        stream: IO[bytes],
+        columns: Iterable[str],
+        numeric_columns: Iterable[str] = (),
+        required: Iterable[str] = (),
+    ) -> Iterator[pd.DataFrame]:
+        """Чтение CSV блоками строк только нужных колонок (UTF-8 или cp1251)"""
+        buffered = io.BufferedReader(stream, ExcelReader.CSV_SNIFF_SIZE)
+        encoding = ExcelReader._csv_encoding(
+            buffered.peek(ExcelReader.CSV_SNIFF_SIZE)
+        )
+        text = io.TextIOWrapper(buffered, encoding=encoding, newline="")
+        try:
+            header_line = text.readline()
+            if not header_line.strip():
+                return
+
+            # Выгрузки бывают как с ';', так и с ','
+            sep = ";" if header_line.count(";") > header_line.count(",") else ","
+            header = [
+                name.strip() for name in next(csv.reader([header_line], delimiter=sep))
+            ]
+
+            # Неподходящий файл отклоняется до чтения данных
+            missing = [name for name in required if name not in header]
+            if missing:
+                raise MissingColumnsError(missing)
+
+            wanted = set(columns)
+            usecols = [
+                idx
+                for idx, name in enumerate(header)
+                if name in wanted and header.index(name) == idx
+            ]
+            if not usecols:
+                yield pd.DataFrame(columns=[])
+                return
+
+            names = [header[idx] for idx in usecols]
+            numeric = set(numeric_columns)
+            reader = pd.read_csv(
+                text,
+                sep=sep,
+                header=None,
+                usecols=usecols,
+                dtype=object,
+                chunksize=ExcelReader.CHUNK_SIZE,
+            )
+            for chunk in reader:
+                chunk = chunk[usecols]
+                chunk.columns = names
+                for name in numeric.intersection(names):
+                    chunk[name] = ExcelReader._csv_numeric(chunk[name])
+                yield ExcelReader.compact_frame(chunk.reset_index(drop=True), numeric)
+        finally:
+            # Исходный поток остается открытым для вызывающего кода
+            text.detach()
+            buffered.detach()
+
+    @staticmethod
+    def _csv_encoding(sample: bytes) -> str:
+        """UTF-8, если начало файла в ней читается, иначе cp1251 - кодировка
+        выгрузок русского Excel"""
+        try:
+            codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        except UnicodeDecodeError:
+            return "cp1251"
+        return "utf-8-sig"
+
+    @staticmethod
+    def _csv_numeric(values: pd.Series) -> pd.Series:
+        """Числа из CSV с учетом десятичной запятой и пробелов-разделителей"""
+        cleaned = (
+            values.str.replace("\u00a0", "", regex=False)
+            .str.replace(" ", "", regex=False)
+            .str.replace(",", ".", regex=False)
+        )
+        return pd.to_numeric(cleaned, errors="coerce").astype(np.float64)
+
+    @staticmethod
+    def read_columns(
+        file_bytes: IO[bytes],
+        columns: Iterable[str],
+        numeric_columns: Iterable[str] = (),
+        file_format: str = None,
+        required: Iterable[str] = (),
+    ) -> pd.DataFrame:
+        """Чтение выбранных колонок листа Excel.
+
+        Сначала по одним заголовкам выбирается лист со всеми колонками required
+        (если такого нет - MissingColumnsError без разбора книги). Затем способы
+        чтения перебираются в порядке Config.EXCEL_READER_BACKENDS: недоступный
+        (не установлен) или упавший способ пропускается. Все способы возвращают
+        одинаковые DataFrame; использованный способ и время чтения записываются
+        в df.attrs и в лог.
+        """
+        file_format = file_format or ExcelReader.detect_format(file_bytes)
+        sheet = ExcelReader.find_sheet(file_bytes, required, file_format)
+        wanted = set(columns)
+        numeric = set(numeric_columns)
+        last_error = None
+
+        for backend in Config.EXCEL_READER_BACKENDS:
+            # openpyxl читает только xlsx
+            if backend == "openpyxl" and file_format != "xlsx":
+                continue
+            reader = getattr(ExcelReader, f"_read_{backend}", None)
+            if reader is None:
+                continue
+
+            file_bytes.seek(0)
+            started = time.perf_counter()
+            try:
+                df = reader(file_bytes, wanted, numeric, sheet)
+            except ImportError:
+                continue
+            except Exception as e:
+                logger.warning(f"Excel reader '{backend}' failed: {e}")
+                last_error = e
+                continue
+
+            df = ExcelReader.compact_frame(df, numeric)
+            elapsed = time.perf_counter() - started
+            df.attrs["reader_backend"] = backend
+            df.attrs["read_seconds"] = elapsed
+            logger.info(f"Excel read with '{backend}' in {elapsed:.2f}s")
+            return df
+
+        raise last_error or ValueError("Нет доступного способа чтения Excel")
+
+    @staticmethod
+    def find_sheet(
+        file_bytes: IO[bytes], required: Iterable[str], file_format: str
+    ) -> Optional[str]:
+        """Выбор листа, в заголовке которого есть все обязательные колонки"""
+        required = list(required)
+        if not required:
+            return None
+
+        try:
+            headers = ExcelReader.read_headers(file_bytes, file_format)
+        except Exception as e:
+            # Без предварительной проверки колонки проверятся после чтения
+            logger.warning(f"Header pre-check skipped: {e}")
+            return None
+        finally:
+            file_bytes.seek(0)
+
+        best_missing = None
+        for sheet, header in headers.items():
+            names = {str(name).strip() for name in header if name is not None}
+            missing = [name for name in required if name not in names]
+            if not missing:
+                return sheet
+            if best_missing is None or len(missing) < len(best_missing):
+                best_missing = missing
+
+        if best_missing is None:
+            return None
+        raise MissingColumnsError(best_missing)
+
+    @staticmethod
+    def read_headers(file_bytes: IO[bytes], file_format: str) -> Dict[str, list]:
+        """Первая строка каждого листа без разбора книги целиком"""
+        if file_format == "xlsx":
+            return ExcelReader._read_xlsx_headers(file_bytes)
+
+        # Для xls заголовки читает calamine (если установлен)
+        frames = pd.read_excel(file_bytes, sheet_name=None, nrows=0, engine="calamine")
+        return {name: list(df.columns) for name, df in frames.items()}
+
+    @staticmethod
+    def _read_xlsx_headers(file_bytes: IO[bytes]) -> Dict[str, list]:
+        """Заголовки листов xlsx прямо из XML: читается только первая строка
+        каждого листа и начало таблицы общих строк"""
+        ns = ExcelReader._NS
+        with zipfile.ZipFile(file_bytes) as archive:
+            rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+            targets = {rel.get("Id"): rel.get("Target") for rel in rels}
+            workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+
+            rows = {}
+            for sheet in workbook.iter(f"{ns}sheet"):
+                target = targets[sheet.get(f"{ExcelReader._REL_NS}id")]
+                path = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+                rows[sheet.get("name")] = ExcelReader._read_first_row(archive, path)
+
+            # Индексы общих строк, которые нужны для заголовков
+            shared = [
+                int(value)
+                for row in rows.values()
+                for kind, value in row.values()
+                if kind == "s"
+            ]
+            strings = (
+                ExcelReader._read_shared_strings(archive, max(shared))
+                if shared
+                else []
+            )
+
+        headers = {}
+        for name, row in rows.items():
+            header = [None] * (max(row) + 1 if row else 0)
+            for idx, (kind, value) in row.items():
+                header[idx] = strings[int(value)] if kind == "s" else value
+            headers[name] = header
+        return headers
+
+    @staticmethod
+    def _read_first_row(archive: zipfile.ZipFile, path: str) -> Dict[int, tuple]:
+        """Ячейки первой строки листа: номер колонки -> (тип, значение)"""
+        ns = ExcelReader._NS
+        cells: Dict[int, tuple] = {}
+        with archive.open(path) as stream:
+            for _, element in ElementTree.iterparse(stream, events=("end",)):
+                if element.tag == f"{ns}c":
+                    ref = element.get("r") or ""
+                    letters = "".join(ch for ch in ref if ch.isalpha())
+                    idx = len(cells)
+                    if letters:
+                        idx = 0
+                        for ch in letters.upper():
+                            idx = idx * 26 + ord(ch) - ord("A") + 1
+                        idx -= 1
+
+                    kind = element.get("t")
+                    if kind == "inlineStr":
+                        value = "".join(t.text or "" for t in element.iter(f"{ns}t"))
+                    else:
+                        value = element.findtext(f"{ns}v")
+                    if value is not None:
+                        cells[idx] = (kind, value)
+                elif element.tag == f"{ns}row":
+                    # Заголовок - только первая строка листа
+                    return cells if element.get("r") in (None, "1") else {}
+        return cells
+
+    @staticmethod
+    def _read_shared_strings(archive: zipfile.ZipFile, last_index: int) -> List[str]:
+        """Начало таблицы общих строк до last_index включительно"""
+        ns = ExcelReader._NS
+        strings: List[str] = []
+        with archive.open("xl/sharedStrings.xml") as stream:
+            for _, element in ElementTree.iterparse(stream, events=("end",)):
+                if element.tag != f"{ns}si":
+                    continue
+                text = element.find(f"{ns}t")
+                if text is not None:
+                    strings.append(text.text or "")
+                else:
+                    strings.append(
+                        "".join(
+                            run.findtext(f"{ns}t") or ""
+                            for run in element.findall(f"{ns}r")
+                        )
+                    )
+                element.clear()
+                if len(strings) > last_index:
+                    break
+        return strings
+
+    @staticmethod
+    def _read_calamine(
+        file_bytes: IO[bytes], wanted: Set[str], numeric: Set[str], sheet: str
+    ) -> pd.DataFrame:
+        """Чтение через нативный python-calamine (если установлен).
+
+        Лист целиком загружается в нативную память calamine, но в Python
+        строки переводятся по одной и от них остаются только нужные колонки.
+        """
+        from python_calamine import CalamineWorkbook
+
+        workbook = CalamineWorkbook.from_filelike(file_bytes)
+        try:
+            worksheet = (
+                workbook.get_sheet_by_name(sheet)
+                if sheet is not None
+                else workbook.get_sheet_by_index(0)
+            )
+            return ExcelReader._collect_rows(
+                worksheet.iter_rows(), wanted, numeric
+            )
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def _read_pandas(
+        file_bytes: IO[bytes], wanted: Set[str], numeric: Set[str], sheet: str
+    ) -> pd.DataFrame:
+        """Чтение стандартным pd.read_excel"""
+        return ExcelReader._read_with_pandas(file_bytes, wanted, numeric, sheet, None)
+
+    @staticmethod
+    def _read_with_pandas(
+        file_bytes: IO[bytes],
+        wanted: Set[str],
+        numeric: Set[str],
+        sheet: Optional[str],
+        engine: Optional[str],
+    ) -> pd.DataFrame:
+        """Чтение через pd.read_excel с приведением к общему виду"""
+        df = pd.read_excel(
+            file_bytes,
+            sheet_name=sheet if sheet is not None else 0,
+            engine=engine,
+            usecols=lambda name: str(name).strip() in wanted,
+            dtype=object,
+            na_values=[""],
+            keep_default_na=False,
+        )
+        df.columns = [str(name).strip() for name in df.columns]
+        df = df.loc[:, ~df.columns.duplicated()]
+        return pd.DataFrame(
+            {
+                name: ExcelReader._to_array(df[name].to_numpy(), name in numeric)
+                for name in df.columns
+                if name in wanted
+            }
+        )
+
+    @staticmethod
+    def _read_openpyxl(
+        file_bytes: IO[bytes], wanted: Set[str], numeric: Set[str], sheet: str
+    ) -> pd.DataFrame:
+        """Потоковое чтение openpyxl в режиме read-only"""
+        workbook = load_workbook(file_bytes, read_only=True, data_only=True)
+        try:
+            worksheet = workbook[sheet] if sheet is not None else workbook.worksheets[0]
+            return ExcelReader._collect_rows(
+                worksheet.iter_rows(values_only=True), wanted, numeric
+            )
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def _collect_rows(
+        rows: Iterator[tuple], wanted: Set[str], numeric: Set[str]
+    ) -> pd.DataFrame:
+        """Нужные колонки из потока строк листа (первая строка - заголовок).
+
+        В Python-объектах одновременно держится не больше CHUNK_SIZE строк
+        и только выбранные колонки.
+        """
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+
+        # Позиции нужных колонок (как и pandas, берем первое вхождение)
+        positions: Dict[str, int] = {}
+        for idx, name in enumerate(header):
+            name = str(name).strip() if name is not None else ""
+            if name in wanted and name not in positions:
+                positions[name] = idx
+
+        names = list(positions)
+        if not names:
+            return pd.DataFrame()
+
+        width = max(positions.values()) + 1
+        getter = itemgetter(*positions.values())
+        chunks: Dict[str, List[np.ndarray]] = {name: [] for name in names}
+        buffer: List[tuple] = []
+
+        def flush():
+            values = zip(*buffer) if len(names) > 1 else [buffer]
+            for name, column in zip(names, values):
+                chunks[name].append(ExcelReader._to_array(column, name in numeric))
+            buffer.clear()
+
+        for row in rows:
+            if len(row) < width:
+                row = tuple(row) + (None,) * (width - len(row))
+            buffer.append(getter(row))
+            if len(buffer) >= ExcelReader.CHUNK_SIZE:
+                flush()
+        if buffer:
+            flush()
+
+        return pd.DataFrame(
+            {
+                name: np.concatenate(parts)
+                if parts
+                else np.array([], dtype=float if name in numeric else object)
+                for name, parts in chunks.items()
+            }
+        )
+
+    @staticmethod
+    def compact_frame(
+        df: pd.DataFrame, numeric: Iterable[str] = (), floats: bool = True
+    ) -> pd.DataFrame:
+        """Компактные типы колонок: строки - без пробелов по краям и в виде
+        категорий, числа - в наименьшем типе, хранящем значения без потерь.
+
+        floats=False оставляет дробные колонки в float64: для денежных итогов,
+        с которыми дальше идет арифметика, float32 накапливает ошибку.
+        """
+        numeric = set(numeric)
+        columns = {}
+        for name in df.columns:
+            values = df[name]
+            if name in numeric or values.dtype != object:
+                columns[name] = ExcelReader._downcast(values, floats)
+            else:
+                columns[name] = ExcelReader._to_categorical(values)
+        return pd.DataFrame(columns, index=df.index)
+
+    @staticmethod
+    def _to_categorical(values: pd.Series) -> pd.Series:
+        """Строковая колонка в виде категорий; пробелы обрезаются один раз
+        для каждого уникального значения, а не для каждой строки.
+
+        Все значения - строки: артикул 100012 из ячейки-числа xlsx и "100012"
+        из CSV становятся одним ключом при любом способе чтения.
+        """
+        codes, uniques = pd.factorize(values)
+        stripped = np.array(
+            [ExcelReader._as_text(value) for value in uniques], dtype=object
+        )
+        remap, categories = pd.factorize(stripped, sort=True)
+        if len(remap):
+            # Во всей колонке пусто - коды уже -1, перенумеровывать нечего
+            codes = np.where(codes >= 0, remap[codes], -1)
+        return pd.Series(
+            pd.Categorical.from_codes(codes, categories=categories),
+            index=values.index,
+            name=values.name,
+        )
+
+    @staticmethod
+    def _as_text(value) -> str:
+        """Значение ячейки текстом без пробелов по краям, целые - без дробной части"""
+        if isinstance(value, str):
+            return value.strip()
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
+
+    @staticmethod
+    def _downcast(values: pd.Series, floats: bool = True) -> pd.Series:
+        """Числа в меньшем типе, только если значения сохраняются точно"""
+        if values.dtype == np.float64 and floats:
+            narrow = values.astype(np.float32)
+            if np.array_equal(narrow.to_numpy(np.float64), values.to_numpy(), True):
+                return narrow
+        elif values.dtype == np.int64 and len(values):
+            limits = np.iinfo(np.int32)
+            if limits.min <= values.min() and values.max() <= limits.max:
+                return values.astype(np.int32)
+        return values
+
+    @staticmethod
+    def _to_array(values, is_numeric: bool) -> np.ndarray:
+        """Перевод значений колонки в типизированный массив"""
+        array = np.array(values, dtype=object)
+        if is_numeric:
+            return pd.to_numeric(array, errors="coerce").astype(np.float64)
+
+        # Пустые значения - None, целые числа (например, артикулы) - int,
+        # независимо от того, как их вернул конкретный способ чтения
+        # (calamine отдает пустые ячейки как "")
+        array[pd.isna(array) | (array == "")] = None
+        integral = np.fromiter(
+            (isinstance(value, float) and value.is_integer() for value in array),
+            dtype=bool,
+            count=len(array),
+        )
+        if integral.any():
+            array[integral] = [int(value) for value in array[integral]]
+        return array
@@ -0,0 +1,21 @@
+from io import BytesIO
+from typing import BinaryIO, Optional
+
+import pandas as pd
+
+from .arrow_compat import stringify_mixed
+
+
+class ParquetExporter:
+    """Выгрузка результата анализа в Parquet для BI-инструментов"""
+
+    @staticmethod
+    def export(df: pd.DataFrame, output: Optional[BinaryIO] = None) -> BinaryIO:
+        """Parquet с типами колонок DataFrame (без openpyxl и форматирования)"""
+        output = output if output is not None else BytesIO()
+        # Arrow требует один тип на колонку
+        stringify_mixed(df).to_parquet(
+            output, engine="pyarrow", index=False, compression="zstd"
+        )
+        output.seek(0)
+        return output
@@ -0,0 +1,329 @@
+import logging
+import os
+import zlib
+from io import BytesIO
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+import matplotlib
+from fontTools import subset
+from fontTools.ttLib import TTFont
+
+# Шрифты DejaVu поставляются с matplotlib и содержат кириллицу
+FONT_DIR = os.path.join(matplotlib.get_data_path(), "fonts", "ttf")
+FONT_FILES = {False: "DejaVuSans.ttf", True: "DejaVuSans-Bold.ttf"}
+
+# Подмножество шрифта строится для каждого отчета - подробности не нужны в логе
+logging.getLogger("fontTools.subset").setLevel(logging.WARNING)
+
+# A4 альбомной ориентации, в пунктах
+A4_LANDSCAPE = (842.0, 595.0)
+
+Color = Tuple[float, float, float]
+
+
+class _Glyphs(dict):
+    """Символ -> номер глифа в hex; символы без глифа - пустой глиф"""
+
+    def __missing__(self, char):
+        return "0000"
+
+
+class _Widths(dict):
+    """Символ -> ширина глифа в тысячных долях кегля"""
+
+    def __missing__(self, char):
+        return self.default
+
+
+class _Font:
+    """Метрики шрифта TrueType: таблицы строятся один раз на процесс"""
+
+    _cache: Dict[bool, "_Font"] = {}
+
+    def __init__(self, path: str):
+        self.path = path
+        font = TTFont(path, lazy=True)
+        scale = 1000 / font["head"].unitsPerEm
+        metrics = font["hmtx"].metrics
+        order = font.getGlyphOrder()
+        self.name = font["name"].getDebugName(6)
+        self.gids: Dict[int, int] = {}
+        self.glyphs = _Glyphs()
+        self.widths = _Widths()
+        for code, glyph in font.getBestCmap().items():
+            gid = font.getGlyphID(glyph)
+            self.gids[code] = gid
+            self.glyphs[code] = f"{gid:04x}"
+            self.widths[chr(code)] = round(metrics[glyph][0] * scale)
+        self.widths.default = round(metrics[order[0]][0] * scale)
+        head, hhea = font["head"], font["hhea"]
+        self.bbox = [
+            round(value * scale)
+            for value in (head.xMin, head.yMin, head.xMax, head.yMax)
+        ]
+        self.ascent = round(hhea.ascent * scale)
+        self.descent = round(hhea.descent * scale)
+        os2 = font["OS/2"]
+        self.cap_height = round(
+            getattr(os2, "sCapHeight", hhea.ascent) * scale
+        )
+        font.close()
+
+    @classmethod
+    def get(cls, bold: bool) -> "_Font":
+        font = cls._cache.get(bold)
+        if font is None:
+            font = cls._cache[bold] = _Font(os.path.join(FONT_DIR, FONT_FILES[bold]))
+        return font
+
+    def subset(self, chars: set) -> bytes:
+        """Файл шрифта только с нужными глифами; номера глифов сохраняются,
+        поэтому текст страниц ссылается на глифы исходного шрифта"""
+        options = subset.Options()
+        options.retain_gids = True
+        options.hinting = False
+        options.layout_features = []
+        options.drop_tables += ["FFTM"]
+        subsetter = subset.Subsetter(options)
+        subsetter.populate(unicodes=[ord(char) for char in chars])
+        # Без отметки времени файл отчета не зависит от момента построения
+        font = TTFont(self.path, recalcTimestamp=False)
+        subsetter.subset(font)
+        output = BytesIO()
+        font.save(output)
+        font.close()
+        return output.getvalue()
+
+
+class PdfWriter:
+    """Минимальный PDF: текст шрифтом DejaVu, линии и растровые изображения.
+
+    Страницы пишутся в output по мере готовности, в памяти остаются только
+    текущая страница и набор использованных символов. Текст выводится
+    строками целиком, без посимвольной раскладки matplotlib, поэтому
+    страница таблицы строится за миллисекунды.
+    """
+
+    def __init__(
+        self, output: BinaryIO, page_size: Tuple[float, float] = A4_LANDSCAPE
+    ):
+        self.output = output
+        self.width, self.height = page_size
+        self._offset = 0
+        self._offsets: Dict[int, int] = {}
+        self._next_id = 3  # 1 - каталог, 2 - дерево страниц
+        self._pages: List[int] = []
+        self._fonts: Dict[bool, int] = {}
+        self._used: Dict[bool, set] = {}
+        self._content: List[str] = []
+        self._page_fonts: set = set()
+        self._page_images: Dict[str, int] = {}
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def __enter__(self) -> "PdfWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+
+    @staticmethod
+    def text_width(text: str, size: float, bold: bool = False) -> float:
+        """Ширина строки в пунктах"""
+        widths = _Font.get(bold).widths
+        return sum(map(widths.__getitem__, text)) * size / 1000
+
+    def text(
+        self,
+        x: float,
+        y: float,
+        text: str,
+        size: float = 9,
+        bold: bool = False,
+        align: str = "left",
+        color: Optional[Color] = None,
+    ) -> None:
+        """Строка текста; y - базовая линия, align - left, right или center"""
+        if not text:
+            return
+        font = _Font.get(bold)
+        if align != "left":
+            width = self.text_width(text, size, bold)
+            x -= width if align == "right" else width / 2
+        self._used.setdefault(bold, set()).update(text)
+        self._page_fonts.add(bold)
+        fill = f"{color[0]:.3f} {color[1]:.3f} {color[2]:.3f} rg " if color else ""
+        self._content.append(
+            f"BT {fill}/F{int(bold)} {size:g} Tf {x:.2f} {y:.2f} Td "
+            f"<{text.translate(font.glyphs)}> Tj ET"
+        )
+
+    def line(
+        self,
+        x1: float,
+        y1: float,
+        x2: float,
+        y2: float,
+        color: Color = (0, 0, 0),
+        width: float = 1.0,
+    ) -> None:
+        """Отрезок прямой"""
+        self._content.append(
+            f"q {color[0]:.3f} {color[1]:.3f} {color[2]:.3f} RG {width:g} w "
+            f"{x1:.2f} {y1:.2f} m {x2:.2f} {y2:.2f} l S Q"
+        )
+
+    def image(self, pixels, x: float, y: float, width: float, height: float) -> None:
+        """Изображение RGB (массив uint8 высота x ширина x 3) в заданной области"""
+        rows, columns = pixels.shape[:2]
+        data = zlib.compress(pixels.tobytes(), 6)
+        image_id = self._write_object(
+            f"<< /Type /XObject /Subtype /Image /Width {columns} /Height {rows} "
+            "/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode "
+            f"/Length {len(data)} >>",
+            data,
+        )
+        name = f"Im{len(self._page_images)}"
+        self._page_images[name] = image_id
+        self._content.append(
+            f"q {width:.2f} 0 0 {height:.2f} {x:.2f} {y:.2f} cm /{name} Do Q"
+        )
+
+    def new_page(self) -> None:
+        """Завершение текущей страницы и переход к следующей"""
+        content = zlib.compress("\n".join(self._content).encode("latin-1"), 6)
+        content_id = self._write_object(
+            f"<< /Filter /FlateDecode /Length {len(content)} >>", content
+        )
+        fonts = " ".join(
+            f"/F{int(bold)} {self._font_id(bold)} 0 R"
+            for bold in sorted(self._page_fonts)
+        )
+        images = " ".join(
+            f"/{name} {image_id} 0 R" for name, image_id in self._page_images.items()
+        )
+        self._pages.append(
+            self._write_object(
+                f"<< /Type /Page /Parent 2 0 R "
+                f"/MediaBox [0 0 {self.width:g} {self.height:g}] "
+                f"/Resources << /Font << {fonts} >> /XObject << {images} >> >> "
+                f"/Contents {content_id} 0 R >>"
+            )
+        )
+        self._content = []
+        self._page_fonts = set()
+        self._page_images = {}
+
+    def close(self) -> None:
+        """Запись последней страницы, шрифтов и таблицы ссылок"""
+        if self._content or not self._pages:
+            self.new_page()
+        for bold, font_id in self._fonts.items():
+            self._write_font(font_id, bold)
+        kids = " ".join(f"{page} 0 R" for page in self._pages)
+        self._write_object(
+            f"<< /Type /Pages /Kids [{kids}] /Count {len(self._pages)} >>", object_id=2
+        )
+        self._write_object("<< /Type /Catalog /Pages 2 0 R >>", object_id=1)
+
+        xref = self._offset
+        count = self._next_id
+        lines = [f"xref\n0 {count}\n", "0000000000 65535 f \n"]
+        lines.extend(f"{self._offsets[i]:010d} 00000 n \n" for i in range(1, count))
+        lines.append(
+            f"trailer\n<< /Size {count} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+        )
+        self._write("".join(lines).encode("latin-1"))
+
+    def _font_id(self, bold: bool) -> int:
+        """Номер объекта шрифта; сам шрифт пишется при закрытии"""
+        font_id = self._fonts.get(bold)
+        if font_id is None:
+            font_id = self._fonts[bold] = self._reserve()
+        return font_id
+
+    def _write_font(self, font_id: int, bold: bool) -> None:
+        """Шрифт Type0 с подмножеством глифов и таблицей ToUnicode"""
+        font = _Font.get(bold)
+        used = {}
+        for char in self._used[bold]:
+            gid = font.gids.get(ord(char))
+            if gid is not None:
+                used.setdefault(gid, char)
+        # Префикс из шести букв - признак подмножества шрифта
+        name = f"{'WBREPB' if bold else 'WBREPA'}+{font.name}"
+
+        data = font.subset(used.values())
+        packed = zlib.compress(data, 6)
+        file_id = self._write_object(
+            f"<< /Length {len(packed)} /Length1 {len(data)} /Filter /FlateDecode >>",
+            packed,
+        )
+        descriptor_id = self._write_object(
+            f"<< /Type /FontDescriptor /FontName /{name} /Flags 32 "
+            f"/FontBBox [{' '.join(map(str, font.bbox))}] /ItalicAngle 0 "
+            f"/Ascent {font.ascent} /Descent {font.descent} "
+            f"/CapHeight {font.cap_height} /StemV 80 /FontFile2 {file_id} 0 R >>"
+        )
+        widths = " ".join(
+            f"{gid} [{font.widths[char]}]" for gid, char in sorted(used.items())
+        )
+        cid_id = self._write_object(
+            f"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /{name} "
+            "/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+            f"/FontDescriptor {descriptor_id} 0 R /DW {font.widths.default} "
+            f"/W [{widths}] /CIDToGIDMap /Identity >>"
+        )
+        cmap = zlib.compress(self._to_unicode(used).encode("latin-1"), 6)
+        to_unicode_id = self._write_object(
+            f"<< /Filter /FlateDecode /Length {len(cmap)} >>", cmap
+        )
+        self._write_object(
+            f"<< /Type /Font /Subtype /Type0 /BaseFont /{name} "
+            f"/Encoding /Identity-H /DescendantFonts [{cid_id} 0 R] "
+            f"/ToUnicode {to_unicode_id} 0 R >>",
+            object_id=font_id,
+        )
+
+    @staticmethod
+    def _to_unicode(used: Dict[int, str]) -> str:
+        """CMap глиф -> символ: текст PDF можно копировать и искать"""
+        entries = [
+            f"<{gid:04x}> <{char.encode('utf-16-be').hex()}>"
+            for gid, char in sorted(used.items())
+        ]
+        blocks = [
+            f"{len(entries[i : i + 100])} beginbfchar\n"
+            + "\n".join(entries[i : i + 100])
+            + "\nendbfchar"
+            for i in range(0, len(entries), 100)
+        ]
+        return (
+            "/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n"
+            "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n"
+            "/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n"
+            "1 begincodespacerange\n<0000> <ffff>\nendcodespacerange\n"
+            + "\n".join(blocks)
+            + "\nendcmap\nCMapName currentdict /CMap defineresource pop\nend\nend\n"
+        )
+
+    def _reserve(self) -> int:
+        object_id = self._next_id
+        self._next_id += 1
+        return object_id
+
+    def _write_object(
+        self, header: str, stream: Optional[bytes] = None, object_id: int = None
+    ) -> int:
+        if object_id is None:
+            object_id = self._reserve()
+        self._offsets[object_id] = self._offset
+        data = f"{object_id} 0 obj\n{header}\n".encode("latin-1")
+        if stream is not None:
+            data += b"stream\n" + stream + b"\nendstream\n"
+        self._write(data + b"endobj\n")
+        return object_id
+
+    def _write(self, data: bytes) -> None:
+        self.output.write(data)
+        self._offset += len(data)
@@ -1,69 +1,69 @@
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
+
+from .storage import Storage, storage
 
 
 class ReferralManager:
-    """Менеджер реферальной системы (хранение в оперативной памяти)"""
+    """Менеджер реферальной системы (хранение в общем хранилище)"""
+
+    def __init__(self, storage: Storage):
+        # referral:<ID реферала> – referrer (ID пригласившего) и activated (отметка активации)
+        # referrer:<ID реферера> – количество всех и активных рефералов, бонусов
+        self.storage = storage
 
-    def __init__(self):
-        # Словарь рефералов: ключ – ID реферала, значение – словарь с referrer (ID пригласившего) и activated (статус активации)
-        self.referrals: Dict[int, Dict] = {}
-        # Статистика рефереров: ключ – ID пользователя (реферера), значение – словарь с количеством активных и всех рефералов, бонусов
-        self.referrer_stats: Dict[int, Dict[str, int]] = {}
+    async def register_referral(self, referrer_id: int, referral_id: int) -> bool:
+        """Зарегистрировать нового реферала (связать пригласившего с приглашённым пользователем).
 
-    def register_referral(self, referrer_id: int, referral_id: int) -> None:
-        """Зарегистрировать нового реферала (связать пригласившего с приглашённым пользователем)."""
-        if referrer_id == referral_id or referral_id in self.referrals:
-            return
+        Возвращает True, если реферал зарегистрирован впервые.
+        """
+        if referrer_id == referral_id:
+            return False
 
-        self.referrals[referral_id] = {"referrer": referrer_id, "activated": False}
+        if not await self.storage.hsetnx(
+            f"referral:{referral_id}", "referrer", referrer_id
+        ):
+            return False
 
-        if referrer_id not in self.referrer_stats:
-            self.referrer_stats[referrer_id] = {
-                "total": 0,  # ➕ добавлено
-                "active_count": 0,
-                "bonus": 0,
-            }
+        await self.storage.hincrby(f"referrer:{referrer_id}", "total")
+        return True
 
-        self.referrer_stats[referrer_id]["total"] += 1  # ➕ учитываем общее число
+    async def get_referral(self, referral_id: int) -> Optional[Dict]:
+        """Реферер и статус активации пользователя (None, если реферера нет)"""
+        info = await self.storage.hgetall(f"referral:{referral_id}")
+        if not info:
+            return None
+        return {"referrer": int(info["referrer"]), "activated": "activated" in info}
 
-    def activate_referral(self, referral_id: int) -> bool:
+    async def activate_referral(self, referral_id: int) -> bool:
         """Активировать реферала и начислить бонус его рефереру. Возвращает True при успешной активации."""
-        info = self.referrals.get(referral_id)
-        if not info or info.get("activated"):
+        referrer = await self.storage.hget(f"referral:{referral_id}", "referrer")
+        if referrer is None:
             return False
 
-        info["activated"] = True
-        referrer_id = info["referrer"]
-
-        if referrer_id not in self.referrer_stats:
-            self.referrer_stats[referrer_id] = {
-                "total": 1,  # на всякий случай
-                "active_count": 0,
-                "bonus": 0,
-            }
+        # Отметка ставится атомарно: бонус начисляется ровно один раз
+        if not await self.storage.hsetnx(f"referral:{referral_id}", "activated", 1):
+            return False
 
-        self.referrer_stats[referrer_id]["active_count"] += 1
-        self.referrer_stats[referrer_id]["bonus"] += 1
+        await self.storage.hincrby(f"referrer:{referrer}", "active_count")
+        await self.storage.hincrby(f"referrer:{referrer}", "bonus")
         return True
 
-    def get_stats(self, user_id: int) -> Tuple[int, int, int]:
+    async def get_stats(self, user_id: int) -> Tuple[int, int, int]:
         """
         Получить статистику для пользователя: (всего приглашённых, активных рефералов, начислено бонусов).
         """
-        stats = self.referrer_stats.get(user_id)
-        if not stats:
-            return 0, 0, 0
+        stats = await self.storage.hgetall(f"referrer:{user_id}")
         return (
-            stats.get("total", 0),
-            stats.get("active_count", 0),
-            stats.get("bonus", 0),
+            int(stats.get("total", 0)),
+            int(stats.get("active_count", 0)),
+            int(stats.get("bonus", 0)),
         )
 
-    def reset_referrals(self, referrer_id: int) -> None:
+    async def reset_referrals(self, referrer_id: int) -> None:
         """Сбросить начисленные бонусы для указанного реферера (не затрагивая список рефералов)."""
-        if referrer_id in self.referrer_stats:
-            self.referrer_stats[referrer_id]["bonus"] = 0
+        if await self.storage.hgetall(f"referrer:{referrer_id}"):
+            await self.storage.hset(f"referrer:{referrer_id}", "bonus", 0)
 
 
 # Единственный экземпляр менеджера рефералов (для использования в других модулях)
-referral_manager = ReferralManager()
+referral_manager = ReferralManager(storage)
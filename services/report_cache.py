@@ -0,0 +1,82 @@
+import hashlib
+from collections import OrderedDict
+from io import BytesIO
+from typing import TYPE_CHECKING, Dict, Optional, Set
+
+from config import Config
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class _CacheEntry:
+    """Запись кэша: агрегированный отчет и ссылающиеся на него file_unique_id"""
+
+    __slots__ = ("df", "size", "aliases")
+
+    def __init__(self, df: "pd.DataFrame", size: int):
+        self.df = df
+        self.size = size
+        self.aliases: Set[str] = set()
+
+
+class ReportCache:
+    """LRU-кэш частичных агрегатов основных отчетов с ограничением по памяти.
+
+    Ключ - хеш содержимого файла, дополнительно запись доступна по
+    Telegram file_unique_id, чтобы повторную отправку не скачивать вовсе.
+    Закэшированные DataFrame общие для всех сессий и не должны изменяться.
+    """
+
+    def __init__(self, max_bytes: int = Config.REPORT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._aliases: Dict[str, str] = {}
+
+    @staticmethod
+    def content_hash(file_bytes: BytesIO) -> str:
+        """Хеш содержимого скачанного файла"""
+        return "sha256:" + hashlib.sha256(file_bytes.getbuffer()).hexdigest()
+
+    def key_for(self, file_unique_id: str) -> Optional[str]:
+        """Хеш содержимого, под которым закэширован файл с данным file_unique_id"""
+        return self._aliases.get(file_unique_id)
+
+    def get(self, key: Optional[str]) -> Optional["pd.DataFrame"]:
+        """Поиск отчета по file_unique_id или хешу содержимого"""
+        key = self._aliases.get(key, key)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        self._entries.move_to_end(key)
+        return entry.df
+
+    def put(
+        self, content_hash: str, df: "pd.DataFrame", file_unique_id: str = None
+    ) -> None:
+        """Сохранение отчета с вытеснением давно не использованных записей"""
+        entry = self._entries.get(content_hash)
+        if entry is None:
+            size = int(df.memory_usage(index=True, deep=True).sum())
+            if size > self.max_bytes:
+                return
+            entry = _CacheEntry(df, size)
+            self._entries[content_hash] = entry
+            self.current_bytes += size
+        self._entries.move_to_end(content_hash)
+
+        if file_unique_id:
+            entry.aliases.add(file_unique_id)
+            self._aliases[file_unique_id] = content_hash
+
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= evicted.size
+            for alias in evicted.aliases:
+                self._aliases.pop(alias, None)
+
+
+# Глобальный кэш обработанных отчетов (общий для всех сессий)
+report_cache = ReportCache()
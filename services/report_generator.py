@@ -1,78 +1,148 @@
+import threading
+import numpy as np
 import pandas as pd
 from io import BytesIO
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
+from typing import BinaryIO, List, Optional
+import matplotlib
+
+# Без GUI: бот строит графики только в файлы
+matplotlib.use("Agg")
+# Стиль задается один раз при импорте: pyplot и смена rcParams во время
+# построения небезопасны, если отчеты строятся в потоках пула
+from matplotlib import style
+
+style.use("seaborn-v0_8")
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import to_rgb
+from matplotlib.figure import Figure
 from config import Config
+from .pdf_writer import A4_LANDSCAPE, PdfWriter
+
+# Фигура быстрой сводки переиспользуется в каждом потоке пула
+_quick_look = threading.local()
+
+
+def _format_sku(value) -> str:
+    """Артикул, укороченный до ширины колонки таблицы PDF"""
+    text = str(value)
+    return text if len(text) <= 28 else text[:27] + "…"
 
 
 class ReportGenerator:
     """Генератор различных типов отчетов"""
 
-    @staticmethod
-    def generate_comprehensive_pdf(df: pd.DataFrame) -> BytesIO:
-        """Генерация комплексного PDF отчета"""
-        pdf_buffer = BytesIO()
+    # Колонки таблицы PDF: колонка, заголовок, формат, позиция и выравнивание
+    TABLE_COLUMNS = [
+        ("Артикул поставщика", "Артикул", _format_sku, 0.05, "left"),
+        ("Количество продаж", "Продажи", "{:,.0f}".format, 0.42, "right"),
+        ("Выручка", "Выручка, ₽", "{:,.0f}".format, 0.56, "right"),
+        ("Чистая прибыль", "Чистая прибыль, ₽", "{:,.0f}".format, 0.71, "right"),
+        ("Маржинальность", "Маржинальность", "{:.1%}".format, 0.83, "right"),
+        ("Рентабельность", "Рентабельность", "{:.1%}".format, 0.95, "right"),
+    ]
 
-        with PdfPages(pdf_buffer) as pdf:
-            plt.style.use("seaborn-v0_8")
+    # Таблица PDF: кегль, межстрочный интервал и базовые линии первой строки
+    # и колонтитула, в пунктах
+    TABLE_FONT_SIZE = 9
+    TABLE_LINE_HEIGHT = 13.5
+    TABLE_TOP = 0.87 * A4_LANDSCAPE[1] - TABLE_FONT_SIZE
+    FOOTER_Y = 0.03 * A4_LANDSCAPE[1]
+    # Разрешение графиков, встроенных в PDF изображением
+    CHART_DPI = 150
 
-            # 1. Сводная таблица
-            ReportGenerator._add_summary_table(pdf, df)
+    @staticmethod
+    def generate_comprehensive_pdf(
+        df: pd.DataFrame, output: Optional[BinaryIO] = None
+    ) -> BinaryIO:
+        """Генерация комплексного PDF отчета (без output - в BytesIO)"""
+        pdf_buffer = output if output is not None else BytesIO()
+
+        with PdfWriter(pdf_buffer) as pdf:
+            # 1. Ключевые метрики
+            ReportGenerator._add_key_metrics(pdf, df)
 
             # 2. Визуализации
             ReportGenerator._add_visualizations(pdf, df)
 
-            # 3. Ключевые метрики
-            ReportGenerator._add_key_metrics(pdf, df)
+            # 3. Полная таблица по артикулам
+            ReportGenerator._add_summary_table(pdf, df)
 
         pdf_buffer.seek(0)
         return pdf_buffer
 
     @staticmethod
-    def _add_summary_table(pdf, df):
-        """Добавление сводной таблицы в PDF"""
-        fig, ax = plt.subplots(figsize=(12, 8))
-        ax.axis("tight")
-        ax.axis("off")
-
-        display_df = df.nlargest(15, "Чистая прибыль")[
-            [
-                "Артикул поставщика",
-                "Количество продаж",
-                "Чистая прибыль",
-                "Маржинальность",
-                "Рентабельность",
-            ]
-        ].copy()
+    def warm_up() -> None:
+        """Загрузка шрифтов заранее, чтобы первый отчет их не ждал"""
+        fig = Figure(figsize=(2, 2))
+        fig.subplots().set_title("Прибыль, ₽ %")
+        FigureCanvasAgg(fig).draw()
+        with PdfWriter(BytesIO()) as pdf:
+            pdf.text(0, 0, "Прибыль, ₽ %")
+            pdf.text(0, 0, "Прибыль, ₽ %", bold=True)
 
-        # Форматирование данных для отображения
-        display_df["Чистая прибыль"] = display_df["Чистая прибыль"].apply(
-            lambda x: f"{x:,.0f} ₽"
-        )
-        display_df["Маржинальность"] = (display_df["Маржинальность"] * 100).apply(
-            lambda x: f"{x:.1f}%"
-        )
-        display_df["Рентабельность"] = (display_df["Рентабельность"] * 100).apply(
-            lambda x: f"{x:.1f}%"
+    @staticmethod
+    def table_rows_per_page() -> int:
+        """Строк таблицы на странице: PDF_ROWS_PER_PAGE, но не больше, чем
+        помещается между заголовком и колонтитулом"""
+        bottom = ReportGenerator.FOOTER_Y + 2 * ReportGenerator.TABLE_FONT_SIZE
+        fits = int(
+            (ReportGenerator.TABLE_TOP - bottom) // ReportGenerator.TABLE_LINE_HEIGHT
         )
+        return max(1, min(Config.PDF_ROWS_PER_PAGE, fits + 1))
 
-        table = ax.table(
-            cellText=display_df.values,
-            colLabels=display_df.columns,
-            cellLoc="center",
-            loc="center",
-        )
-        table.auto_set_font_size(False)
-        table.set_fontsize(9)
-        table.scale(1.2, 1.5)
-        ax.set_title("ТОП-15 товаров по чистой прибыли", fontsize=16, pad=20)
-        pdf.savefig(fig, bbox_inches="tight")
-        plt.close()
+    @staticmethod
+    def _add_summary_table(pdf: PdfWriter, df: pd.DataFrame):
+        """Полная таблица по артикулам постранично.
+
+        Строки выводятся прямо в PDF без раскладки matplotlib: время
+        построения растет линейно с числом строк, а в памяти только одна
+        страница.
+        """
+        rows_per_page = ReportGenerator.table_rows_per_page()
+        table_df = df.sort_values("Чистая прибыль", ascending=False)
+        pages = max(1, -(-len(table_df) // rows_per_page))
+        width, height = pdf.width, pdf.height
+        size = ReportGenerator.TABLE_FONT_SIZE
+
+        for page in range(pages):
+            pdf.text(
+                0.05 * width,
+                0.94 * height,
+                "Финансовые показатели по товарам (по убыванию чистой прибыли)",
+                size=14,
+                bold=True,
+            )
+            pdf.line(
+                0.05 * width,
+                0.885 * height,
+                0.95 * width,
+                0.885 * height,
+                color=to_rgb(Config.COLORS["primary"]),
+            )
+            chunk = table_df.iloc[page * rows_per_page : (page + 1) * rows_per_page]
+            for column, header, fmt, x, align in ReportGenerator.TABLE_COLUMNS:
+                pdf.text(
+                    x * width, 0.895 * height, header, size, bold=True, align=align
+                )
+                y = ReportGenerator.TABLE_TOP
+                for value in chunk[column]:
+                    pdf.text(x * width, y, fmt(value), size, align=align)
+                    y -= ReportGenerator.TABLE_LINE_HEIGHT
+            pdf.text(
+                0.95 * width,
+                ReportGenerator.FOOTER_Y,
+                f"Стр. {page + 1} из {pages}",
+                size=8,
+                align="right",
+                color=to_rgb("gray"),
+            )
+            pdf.new_page()
 
     @staticmethod
-    def _add_visualizations(pdf, df):
+    def _add_visualizations(pdf: PdfWriter, df: pd.DataFrame):
         """Добавление визуализаций в PDF"""
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 7))
+        fig = Figure(figsize=(15, 7), dpi=ReportGenerator.CHART_DPI)
+        ax1, ax2 = fig.subplots(1, 2)
 
         # Круговая диаграмма прибыли
         ReportGenerator._add_profit_pie_chart(ax1, df)
@@ -80,16 +150,38 @@ class ReportGenerator:
         # Гистограмма маржинальности
         ReportGenerator._add_margin_chart(ax2, df)
 
-        plt.tight_layout()
-        pdf.savefig(fig, bbox_inches="tight")
-        plt.close()
+        fig.tight_layout()
+        ReportGenerator._add_figure_page(pdf, fig)
+
+    @staticmethod
+    def _add_figure_page(pdf: PdfWriter, fig: Figure, margin: float = 20):
+        """Страница с фигурой matplotlib, отрисованной в Agg и вписанной в лист"""
+        canvas = FigureCanvasAgg(fig)
+        canvas.draw()
+        pixels = np.asarray(canvas.buffer_rgba())[:, :, :3]
+        fig_width, fig_height = fig.get_size_inches() * 72
+        scale = min(
+            (pdf.width - 2 * margin) / fig_width, (pdf.height - 2 * margin) / fig_height
+        )
+        width, height = fig_width * scale, fig_height * scale
+        pdf.image(
+            pixels, (pdf.width - width) / 2, (pdf.height - height) / 2, width, height
+        )
+        pdf.new_page()
 
     @staticmethod
     def _add_profit_pie_chart(ax, df):
         """Добавление круговой диаграммы прибыли"""
         top_n = 5
-        top_df = df.nlargest(top_n, "Чистая прибыль")
-        other_profit = df["Чистая прибыль"].sum() - top_df["Чистая прибыль"].sum()
+        # Доли прибыли имеют смысл только для прибыльных товаров
+        profitable = df[df["Чистая прибыль"] > 0]
+        if profitable.empty:
+            ax.axis("off")
+            return
+        top_df = profitable.nlargest(top_n, "Чистая прибыль")
+        other_profit = (
+            profitable["Чистая прибыль"].sum() - top_df["Чистая прибыль"].sum()
+        )
 
         pie_data = pd.concat(
             [
@@ -100,7 +192,7 @@ class ReportGenerator:
             ]
         )
 
-        colors = plt.cm.Set3.colors
+        colors = matplotlib.colormaps["Set3"].colors
         wedges, texts, autotexts = ax.pie(
             pie_data["Чистая прибыль"],
             labels=pie_data["Артикул поставщика"],
@@ -126,12 +218,26 @@ class ReportGenerator:
             ax.set_ylabel("Маржинальность, %")
 
     @staticmethod
-    def _add_key_metrics(pdf, df):
+    def _add_key_metrics(pdf: PdfWriter, df: pd.DataFrame):
         """Добавление ключевых метрик"""
-        fig, ax = plt.subplots(figsize=(10, 6))
-        ax.axis("off")
+        pdf.text(
+            pdf.width / 2,
+            0.88 * pdf.height,
+            "Ключевые бизнес-метрики",
+            size=16,
+            bold=True,
+            align="center",
+        )
+        y = 0.78 * pdf.height
+        for line in ReportGenerator._key_metrics(df):
+            pdf.text(0.1 * pdf.width, y, line, size=12)
+            y -= 18
+        pdf.new_page()
 
-        total_metrics = [
+    @staticmethod
+    def _key_metrics(df: pd.DataFrame) -> List[str]:
+        """Строки ключевых метрик анализа"""
+        return [
             f"Общая выручка: {df['Выручка'].sum():,.0f} ₽",
             f"Общая прибыль: {df['Чистая прибыль'].sum():,.0f} ₽",
             f"Средняя маржинальность: {(df['Маржинальность'].mean() * 100):.1f}%",
@@ -140,14 +246,44 @@ class ReportGenerator:
             f"Общее количество продаж: {df['Количество продаж'].sum():,.0f}",
         ]
 
-        ax.text(
-            0.1,
+    @staticmethod
+    def generate_quick_look(df: pd.DataFrame, top_n: int = 8) -> BytesIO:
+        """Быстрая сводка одной PNG-картинкой: ключевые метрики и ТОП товаров
+        по прибыли. Без PDF - фигура одна на поток и переиспользуется,
+        разрешение низкое"""
+        fig = getattr(_quick_look, "figure", None)
+        if fig is None:
+            fig = Figure(figsize=(9, 4.5), dpi=Config.QUICK_LOOK_DPI)
+            FigureCanvasAgg(fig)
+            _quick_look.figure = fig
+        else:
+            fig.clear()
+
+        fig.text(
+            0.03,
             0.9,
-            "\n".join(total_metrics),
+            "\n".join(ReportGenerator._key_metrics(df)),
             fontsize=12,
-            verticalalignment="top",
-            linespacing=1.5,
+            va="top",
+            linespacing=1.6,
         )
-        ax.set_title("Ключевые бизнес-метрики", fontsize=16)
-        pdf.savefig(fig, bbox_inches="tight")
-        plt.close()
+        fig.text(0.03, 0.95, "Ключевые метрики", fontsize=12, fontweight="bold")
+
+        top_df = df.nlargest(top_n, "Чистая прибыль").iloc[::-1]
+        ax = fig.add_axes([0.62, 0.12, 0.35, 0.76])
+        colors = [
+            Config.COLORS["success"] if value > 0 else Config.COLORS["danger"]
+            for value in top_df["Чистая прибыль"]
+        ]
+        ax.barh(
+            [_format_sku(sku) for sku in top_df["Артикул поставщика"]],
+            top_df["Чистая прибыль"],
+            color=colors,
+        )
+        ax.set_title(f"ТОП-{top_n} по чистой прибыли, ₽", fontsize=11)
+        ax.tick_params(labelsize=8)
+
+        output = BytesIO()
+        fig.savefig(output, format="png")
+        output.seek(0)
+        return output
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import tempfile
+import time
+
+from config import Config
+from utils.logger import logger
+from .excel_formatter import ExcelFormatter
+from .parquet_exporter import ParquetExporter
+from .report_generator import ReportGenerator
+from .session_manager import UserSession
+from .worker_pool import worker_pool
+
+
+def _render_to_file(kind: str, df) -> str:
+    """Построение отчета сразу во временный файл (выполняется в пуле).
+
+    В процесс бота возвращается только путь: файл не копируется между
+    процессами и не держится в памяти целиком при отправке.
+    """
+    os.makedirs(Config.ARTIFACT_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=f"{kind}_", dir=Config.ARTIFACT_DIR)
+    try:
+        with os.fdopen(fd, "wb") as output:
+            ReportRenderer.RENDERERS[kind](df, output)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+class ReportRenderer:
+    """Построение отчетов в пуле с общими задачами на версию анализа"""
+
+    RENDERERS = {
+        "excel": ExcelFormatter.apply_business_formatting,
+        "pdf": ReportGenerator.generate_comprehensive_pdf,
+        "parquet": ParquetExporter.export,
+    }
+
+    # Заранее строятся только отчеты, которые запрашивают почти всегда
+    PRERENDER_KINDS = ("excel", "pdf")
+
+    @staticmethod
+    def prerender(session: UserSession) -> None:
+        """Фоновое построение Excel и PDF сразу после готовности анализа.
+
+        Построения идут от имени пользователя, поэтому в пуле они выполняются
+        по очереди и занимают не больше одного слота.
+        """
+        if not Config.PRERENDER_REPORTS or session.final_df is None:
+            return
+        for kind in ReportRenderer.PRERENDER_KINDS:
+            if session.get_artifact(kind, session.final_version) is None:
+                ReportRenderer._start(session, kind)
+
+    @staticmethod
+    def is_ready(session: UserSession, kind: str) -> bool:
+        """Отчет текущей версии уже построен"""
+        task = session.renders.get((kind, session.final_version))
+        return (
+            task is not None
+            and task.done()
+            and not task.cancelled()
+            and task.exception() is None
+        )
+
+    @staticmethod
+    async def render(session: UserSession, kind: str) -> str:
+        """Путь к файлу отчета текущей версии: готовому, строящемуся или новому"""
+        task = ReportRenderer._start(session, kind)
+        # Отмена ожидающего обработчика не отменяет общую задачу построения
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _start(session: UserSession, kind: str) -> asyncio.Task:
+        """Задача построения отчета; упавшая или отмененная запускается заново"""
+        key = (kind, session.final_version)
+        task = session.renders.get(key)
+        if task is None or (
+            task.done() and (task.cancelled() or task.exception() is not None)
+        ):
+            task = asyncio.create_task(
+                worker_pool.run(
+                    _render_to_file, kind, session.final_df, owner=session.user_id
+                )
+            )
+            task.add_done_callback(ReportRenderer._log_failure)
+            session.renders[key] = task
+        return task
+
+    @staticmethod
+    def sweep_files(max_age_hours: int = 24) -> int:
+        """Удаление забытых файлов (например, построенных уже после отмены)"""
+        if not os.path.isdir(Config.ARTIFACT_DIR):
+            return 0
+        deadline = time.time() - max_age_hours * 3600
+        removed = 0
+        with os.scandir(Config.ARTIFACT_DIR) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < deadline:
+                        os.remove(entry.path)
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task) -> None:
+        """Ошибка фонового построения не теряется, даже если отчет не запросят"""
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Report rendering failed: {task.exception()}")
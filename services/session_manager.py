@@ -1,50 +1,362 @@
+import asyncio
+import heapq
+import os
+import time
+from collections import OrderedDict
+from contextlib import suppress
 from datetime import datetime
-from typing import Dict, Optional
+from itertools import count
+from typing import Dict, List, Optional, Set, Tuple
 from config import Config
+from utils.logger import logger
+from . import spill
+from .storage import Storage, storage
+
+# Версии результатов анализа не повторяются между сессиями и пересчетами
+_final_versions = count(1)
+
+
+def _discard_render(task: asyncio.Task) -> None:
+    """Отмена построения отчета или удаление уже построенного файла"""
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled() and task.exception() is None:
+        with suppress(OSError):
+            os.remove(task.result())
+
+
+def _frame_size(df) -> int:
+    """Объем DataFrame в памяти, байт"""
+    if df is None:
+        return 0
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class _SpilledFrame:
+    """Заглушка DataFrame, выгруженного на диск"""
+
+    __slots__ = ("path",)
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def remove(self):
+        with suppress(OSError):
+            os.remove(self.path)
+
+
+class _Frame:
+    """Атрибут сессии с DataFrame, объем которого учитывается менеджером"""
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return instance._get_frame(self.name)
+
+    def __set__(self, instance, value):
+        instance._set_frame(self.name, value)
 
 
 class UserSession:
     """Класс для управления сессией пользователя"""
 
-    def __init__(self, user_id: int):
+    main_df = _Frame()
+    cost_df = _Frame()
+    main_partial = _Frame()
+
+    def __init__(self, user_id: int, manager: Optional["SessionManager"] = None):
         self.user_id = user_id
+        self.manager = manager
+        self._frames: Dict[str, object] = {}
+        self.frame_sizes: Dict[str, int] = {}
+        # Данные анализа выгружены менеджером из-за нехватки памяти
+        self.evicted = False
         self.tax_rate: float = Config.DEFAULT_TAX_RATE
+        # Ставка налога прочитана из хранилища (SessionManager.restore)
+        self.restored = False
         self.main_df = None
+        self.cost_df = None
         self.final_df = None
+        # Частичные агрегаты всех загруженных основных отчетов
+        self.main_partial = None
+        self.main_report_keys: Set[str] = set()
         self.created_at = datetime.now()
-        self.last_activity = datetime.now()
+        # Последнее обращение к сессии из любого обработчика
+        self.last_access = time.monotonic()
+        # Срок жизни продлевается только значимыми действиями (update_activity)
+        self.expires_at = self.last_access + Config.SESSION_TTL_HOURS * 3600
+
+    @property
+    def final_df(self):
+        """Итоговый анализ"""
+        return self._get_frame("final_df")
+
+    @final_df.setter
+    def final_df(self, value):
+        # Новый результат - новая версия, отправленные ранее файлы устарели,
+        # а незавершенные построения отчетов по старой версии отменяются
+        for task in getattr(self, "renders", {}).values():
+            _discard_render(task)
+        self._set_frame("final_df", value)
+        self.final_version = next(_final_versions)
+        self.artifacts: Dict[Tuple[str, int], str] = {}
+        # Задачи построения отчетов, результат - путь к временному файлу
+        self.renders: Dict[Tuple[str, int], asyncio.Task] = {}
+
+    @property
+    def memory_bytes(self) -> int:
+        """Суммарный объем DataFrame сессии"""
+        return sum(self.frame_sizes.values())
+
+    def _get_frame(self, name: str):
+        """DataFrame сессии; выгруженный на диск читается обратно"""
+        value = self._frames.get(name)
+        if not isinstance(value, _SpilledFrame):
+            return value
+        try:
+            df = spill.read_frame(value.path)
+        except Exception as e:
+            logger.warning(f"Spilled frame {value.path} can't be loaded: {e}")
+            self._set_frame(name, None)
+            self.evicted = True
+            return None
+        self._set_frame(name, df)
+        return df
+
+    def _set_frame(self, name: str, value):
+        """Замена DataFrame с пересчетом объема сессии"""
+        old = self._frames.get(name)
+        if isinstance(old, _SpilledFrame):
+            old.remove()
+        size = _frame_size(value)
+        delta = size - self.frame_sizes.get(name, 0)
+        self._frames[name] = value
+        self.frame_sizes[name] = size
+        if value is not None:
+            self.evicted = False
+        if self.manager is not None and delta:
+            self.manager.resize(self, delta)
+
+    def resident_frames(self) -> List[Tuple[str, object]]:
+        """DataFrame сессии, находящиеся в памяти"""
+        return [
+            (name, value)
+            for name, value in self._frames.items()
+            if value is not None and not isinstance(value, _SpilledFrame)
+        ]
+
+    def spill_frame(self, name: str, df, path: str) -> bool:
+        """Замена DataFrame заглушкой со ссылкой на его файл.
+
+        Если за время записи файла DataFrame был заменен, файл не нужен.
+        """
+        if self._frames.get(name) is not df:
+            return False
+        size = self.frame_sizes.get(name, 0)
+        self._frames[name] = _SpilledFrame(path)
+        self.frame_sizes[name] = 0
+        if self.manager is not None and size:
+            self.manager.resize(self, -size)
+        return True
+
+    def drop_spilled(self):
+        """Удаление файлов выгруженных DataFrame"""
+        for value in self._frames.values():
+            if isinstance(value, _SpilledFrame):
+                value.remove()
+
+    def get_artifact(self, kind: str, version: int) -> Optional[str]:
+        """file_id отправленного отчета для версии анализа"""
+        return self.artifacts.get((kind, version))
+
+    def set_artifact(self, kind: str, version: int, file_id: str):
+        """Запоминание file_id отчета, если анализ за время отправки не изменился"""
+        if version == self.final_version:
+            self.artifacts[(kind, version)] = file_id
+            # Построенный файл больше не нужен - отчет отправляется по file_id
+            task = self.renders.pop((kind, version), None)
+            if task is not None:
+                _discard_render(task)
+
+    def reset_analysis(self):
+        """Сброс загруженных отчетов и результатов анализа"""
+        self.main_df = None
+        self.cost_df = None
+        self.final_df = None
+        self.main_partial = None
+        self.main_report_keys = set()
+        self.evicted = False
+
+    def evict(self):
+        """Выгрузка данных анализа; налоговая ставка и состояние сохраняются"""
+        self.reset_analysis()
+        self.evicted = True
 
     def update_activity(self):
         """Обновление времени последней активности"""
-        self.last_activity = datetime.now()
+        self.expires_at = time.monotonic() + Config.SESSION_TTL_HOURS * 3600
 
-    def is_expired(self, hours: int = 24) -> bool:
+    def is_expired(self, now: Optional[float] = None) -> bool:
         """Проверка истечения срока сессии"""
-        return (datetime.now() - self.last_activity).total_seconds() > hours * 3600
+        return (time.monotonic() if now is None else now) >= self.expires_at
 
 
 class SessionManager:
-    """Менеджер сессий пользователей"""
+    """Менеджер сессий пользователей.
+
+    Сессии хранятся в порядке последнего обращения. Когда DataFrame всех
+    сессий превышают бюджет памяти, у давно не обращавшихся сессий
+    выгружаются данные анализа.
+
+    Сроки жизни сессий лежат в куче: на каждую сессию одна запись, которая
+    при продлении срока не обновляется, а перекладывается при извлечении.
+    """
 
-    def __init__(self):
-        self.sessions: Dict[int, UserSession] = {}
+    def __init__(
+        self,
+        max_bytes: int = Config.SESSION_MEMORY_BUDGET,
+        storage: Storage = storage,
+    ):
+        # session:<ID пользователя> – tax_rate (налоговая ставка)
+        self.storage = storage
+        self.sessions: "OrderedDict[int, UserSession]" = OrderedDict()
+        self.max_bytes = max_bytes
+        self.memory_bytes = 0
+        self.evictions = 0
+        self.expired = 0
+        self._expiry: List[Tuple[float, int, UserSession]] = []
+        self._expiry_seq = count()
+        self._expiry_added = asyncio.Event()
 
     def get_session(self, user_id: int) -> UserSession:
         """Получение или создание сессии пользователя"""
-        if user_id not in self.sessions or self.sessions[user_id].is_expired():
-            self.sessions[user_id] = UserSession(user_id)
-        return self.sessions[user_id]
-
-    def cleanup_expired(self):
-        """Очистка просроченных сессий"""
-        expired_users = [
-            user_id
-            for user_id, session in self.sessions.items()
-            if session.is_expired()
-        ]
-        for user_id in expired_users:
-            del self.sessions[user_id]
-        return len(expired_users)
+        now = time.monotonic()
+        session = self.sessions.get(user_id)
+        if session is None or session.is_expired(now):
+            if session is not None:
+                self._remove(user_id)
+                self.expired += 1
+            session = self.sessions[user_id] = UserSession(user_id, self)
+            self._push_expiry(session)
+        self.sessions.move_to_end(user_id)
+        session.last_access = now
+        return session
+
+    async def restore(self, session: UserSession) -> None:
+        """Восстановление налоговой ставки новой сессии из хранилища"""
+        tax_rate = await self.storage.hget(f"session:{session.user_id}", "tax_rate")
+        if tax_rate is not None:
+            session.tax_rate = float(tax_rate)
+        session.restored = True
+
+    async def set_tax_rate(self, session: UserSession, tax_rate: float) -> None:
+        """Смена налоговой ставки с сохранением в хранилище"""
+        session.tax_rate = tax_rate
+        session.restored = True
+        await self.storage.hset(f"session:{session.user_id}", "tax_rate", tax_rate)
+
+    def _push_expiry(self, session: UserSession):
+        heapq.heappush(
+            self._expiry, (session.expires_at, next(self._expiry_seq), session)
+        )
+        self._expiry_added.set()
+
+    def resize(self, session: UserSession, delta: int):
+        """Учет изменения объема сессии и соблюдение бюджета памяти"""
+        self.memory_bytes += delta
+        if delta > 0 and self.memory_bytes > self.max_bytes:
+            self._evict(keep=session)
+
+    def _evict(self, keep: UserSession):
+        """Выгрузка данных сессий от давно не обращавшихся к недавним"""
+        for session in list(self.sessions.values()):
+            if self.memory_bytes <= self.max_bytes:
+                break
+            if session is keep or not session.memory_bytes:
+                continue
+            freed = session.memory_bytes
+            session.evict()
+            self.evictions += 1
+            logger.info(
+                f"Session data of {session.user_id} evicted, "
+                f"{freed / 1024 / 1024:.1f} MB freed"
+            )
+
+    def _remove(self, user_id: int):
+        """Удаление сессии с освобождением ее доли бюджета"""
+        session = self.sessions.pop(user_id)
+        self.memory_bytes -= session.memory_bytes
+        session.drop_spilled()
+        # Обработчик, еще держащий сессию, не должен влиять на учет памяти
+        session.manager = None
+
+    async def spill_idle(
+        self, idle_minutes: int = Config.SESSION_SPILL_AFTER_MINUTES
+    ) -> int:
+        """Выгрузка DataFrame простаивающих сессий на диск.
+
+        В памяти остаются только заглушки, данные читаются обратно при
+        следующем обращении обработчика. Файлы пишутся в отдельном потоке.
+        """
+        deadline = time.monotonic() - idle_minutes * 60
+        spilled = 0
+        # Сессии упорядочены по обращению: дальше только недавние
+        for session in list(self.sessions.values()):
+            if session.last_access > deadline:
+                break
+            for name, df in session.resident_frames():
+                try:
+                    path = await asyncio.to_thread(
+                        spill.write_frame,
+                        df,
+                        Config.SPILL_DIR,
+                        f"{session.user_id}_{name}_",
+                    )
+                except Exception as e:
+                    # Кадр остается в памяти, остальные выгружаются как обычно
+                    logger.warning(
+                        f"Spilling {name} of session {session.user_id} failed: {e}"
+                    )
+                    continue
+                if session.spill_frame(name, df, path):
+                    spilled += 1
+                else:
+                    _SpilledFrame(path).remove()
+        return spilled
+
+    def cleanup_expired(self) -> int:
+        """Удаление сессий с истекшим сроком, O(log n) на сессию"""
+        now = time.monotonic()
+        removed = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            _, _, session = heapq.heappop(self._expiry)
+            if self.sessions.get(session.user_id) is not session:
+                continue  # сессия уже удалена или заменена новой
+            if session.is_expired(now):
+                self._remove(session.user_id)
+                removed += 1
+            else:
+                # Срок был продлен - запись возвращается с новым сроком
+                self._push_expiry(session)
+        self.expired += removed
+        return removed
+
+    async def run_expiry(self):
+        """Удаление сессий в момент истечения их срока"""
+        while True:
+            if not self._expiry:
+                self._expiry_added.clear()
+                await self._expiry_added.wait()
+                continue
+            delay = self._expiry[0][0] - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            cleaned_count = self.cleanup_expired()
+            if cleaned_count > 0:
+                logger.info(f"🧹 Очищено {cleaned_count} устаревших сессий")
 
 
 # Глобальный экземпляр менеджера сессий
@@ -0,0 +1,60 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SingleFlight:
+    """Не более одной задачи на владельца (пользователя).
+
+    Задача с тем же ключом, что и выполняющаяся, не запускается повторно,
+    а задача с новым ключом отменяет прежнюю или, с queue=True, ждет ее
+    завершения.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[Hashable, Tuple[Hashable, asyncio.Task]] = {}
+
+    def start(
+        self,
+        owner: Hashable,
+        key: Hashable,
+        factory: Callable[[], Awaitable[Any]],
+        queue: bool = False,
+    ) -> Tuple[asyncio.Task, bool]:
+        """Задача владельца и признак того, что она запущена этим вызовом"""
+        previous = None
+        current = self._jobs.get(owner)
+        if current is not None and not current[1].done():
+            if current[0] == key:
+                return current[1], False
+            if queue:
+                previous = current[1]
+            else:
+                current[1].cancel()
+
+        task = asyncio.create_task(self._run_after(previous, factory))
+        self._jobs[owner] = (key, task)
+        task.add_done_callback(lambda done: self._forget(owner, done))
+        return task, True
+
+    @staticmethod
+    async def _run_after(
+        previous: Optional[asyncio.Task], factory: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        if previous is not None:
+            # Ошибка или отмена предыдущей задачи на очередную не влияет
+            await asyncio.wait([previous])
+        return await factory()
+
+    def current(self, owner: Hashable) -> Optional[asyncio.Task]:
+        """Выполняющаяся задача владельца"""
+        current = self._jobs.get(owner)
+        return current[1] if current is not None else None
+
+    def superseded(self, owner: Hashable, task: asyncio.Task) -> bool:
+        """Задача отменена, потому что владелец запустил новую"""
+        current = self.current(owner)
+        return task.cancelled() and current is not None and current is not task
+
+    def _forget(self, owner: Hashable, task: asyncio.Task) -> None:
+        if self.current(owner) is task:
+            del self._jobs[owner]
@@ -0,0 +1,61 @@
+import os
+import tempfile
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def write_frame(df: "pd.DataFrame", directory: str, prefix: str) -> str:
+    """Сохранение DataFrame в файл Feather, возвращается путь.
+
+    Файл пишется без сжатия, чтобы при чтении его можно было отобразить
+    в память, а не распаковывать. Колонки и уровни индекса со смешанными
+    типами Arrow хранит только строками, а данные сессии после чтения должны
+    совпадать с исходными, поэтому такие DataFrame сохраняются в pickle.
+    """
+    from pyarrow import feather
+    from .arrow_compat import has_mixed_types
+
+    pickled = has_mixed_types(df)
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(
+        prefix=prefix, suffix=".pkl" if pickled else ".feather", dir=directory
+    )
+    os.close(fd)
+    try:
+        if pickled:
+            df.to_pickle(path, compression=None)
+        else:
+            feather.write_feather(df, path, compression="uncompressed")
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def read_frame(path: str) -> "pd.DataFrame":
+    """Чтение DataFrame из файла Feather через отображение в память"""
+    from pyarrow import feather
+
+    if path.endswith(".pkl"):
+        import pandas as pd
+
+        return pd.read_pickle(path, compression=None)
+    return feather.read_table(path, memory_map=True).to_pandas()
+
+
+def clear_directory(directory: str) -> int:
+    """Удаление файлов, оставшихся от предыдущего запуска"""
+    if not os.path.isdir(directory):
+        return 0
+    removed = 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file():
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                continue
+    return removed
@@ -0,0 +1,106 @@
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+
+class StatsStore:
+    """Хранилище статистики пользователей в SQLite (режим WAL).
+
+    Записи приходят пачками из буфера AdminManager, поэтому на каждое
+    событие пользователя обращения к диску нет.
+    """
+
+    COLUMNS = (
+        "user_id",
+        "username",
+        "first_name",
+        "last_name",
+        "sessions_count",
+        "files_processed",
+        "last_activity",
+        "created_at",
+    )
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            sessions_count INTEGER NOT NULL DEFAULT 0,
+            files_processed INTEGER NOT NULL DEFAULT 0,
+            last_activity TEXT,
+            created_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS user_stats_last_activity
+            ON user_stats (last_activity);
+        CREATE INDEX IF NOT EXISTS user_stats_files_processed
+            ON user_stats (files_processed);
+    """
+
+    DATETIME_COLUMNS = ("last_activity", "created_at")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._initialized = False
+
+    def _initialize(self) -> None:
+        """Создание файла, схемы и включение WAL (режим сохраняется в файле)"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(sqlite3.connect(self.path)) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.SCHEMA)
+        self._initialized = True
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            self._initialize()
+        conn = sqlite3.connect(self.path)
+        # В WAL полная синхронизация на каждую запись не нужна
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def load(self) -> List[Dict]:
+        """Все сохраненные записи статистики"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM user_stats"
+            ).fetchall()
+        records = []
+        for row in rows:
+            record = dict(zip(self.COLUMNS, row))
+            for column in self.DATETIME_COLUMNS:
+                if record[column]:
+                    record[column] = datetime.fromisoformat(record[column])
+            records.append(record)
+        return records
+
+    def save(self, records: Iterable[Dict]) -> int:
+        """Сохранение пачки записей одной транзакцией"""
+        rows = [
+            tuple(
+                record[column].isoformat()
+                if column in self.DATETIME_COLUMNS and record[column]
+                else record[column]
+                for column in self.COLUMNS
+            )
+            for record in records
+        ]
+        if not rows:
+            return 0
+        placeholders = ", ".join("?" for _ in self.COLUMNS)
+        updates = ", ".join(
+            f"{column} = excluded.{column}" for column in self.COLUMNS[1:]
+        )
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                f"INSERT INTO user_stats ({', '.join(self.COLUMNS)}) "
+                f"VALUES ({placeholders}) "
+                f"ON CONFLICT (user_id) DO UPDATE SET {updates}",
+                rows,
+            )
+        return len(rows)
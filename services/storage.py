@@ -0,0 +1,109 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+from config import Config
+
+
+class Storage(ABC):
+    """Хранилище данных бота вне процесса (хеши строк, как в Redis).
+
+    Во внешнем бэкенде хранятся рефералы и ставки налога пользователей;
+    вместе с состояниями FSM они переживают перезапуск бота. Данные анализа
+    (DataFrame и список загруженных отчетов) и статистика админки остаются
+    в процессе. Операции, изменяющие счетчики и флаги, атомарны.
+    """
+
+    @abstractmethod
+    async def hget(self, key: str, field: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def hgetall(self, key: str) -> Dict[str, str]:
+        ...
+
+    @abstractmethod
+    async def hset(self, key: str, field: str, value) -> None:
+        ...
+
+    @abstractmethod
+    async def hsetnx(self, key: str, field: str, value) -> bool:
+        """Установка поля, только если его еще нет; True - если установлено"""
+
+    @abstractmethod
+    async def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryStorage(Storage):
+    """Хранилище в памяти процесса (один экземпляр бота)"""
+
+    def __init__(self):
+        self._data: Dict[str, Dict[str, str]] = {}
+
+    async def hget(self, key: str, field: str) -> Optional[str]:
+        return self._data.get(key, {}).get(field)
+
+    async def hgetall(self, key: str) -> Dict[str, str]:
+        return dict(self._data.get(key, {}))
+
+    async def hset(self, key: str, field: str, value) -> None:
+        self._data.setdefault(key, {})[field] = str(value)
+
+    async def hsetnx(self, key: str, field: str, value) -> bool:
+        fields = self._data.setdefault(key, {})
+        if field in fields:
+            return False
+        fields[field] = str(value)
+        return True
+
+    async def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        fields = self._data.setdefault(key, {})
+        value = int(fields.get(field, 0)) + amount
+        fields[field] = str(value)
+        return value
+
+
+class RedisStorage(Storage):
+    """Хранилище на сервере с протоколом Redis (Redis, Valkey, KeyDB)"""
+
+    def __init__(self, client, prefix: str = "wb:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = "wb:") -> "RedisStorage":
+        from redis.asyncio import Redis
+
+        return cls(Redis.from_url(url, decode_responses=True), prefix)
+
+    async def hget(self, key: str, field: str) -> Optional[str]:
+        return await self.client.hget(self.prefix + key, field)
+
+    async def hgetall(self, key: str) -> Dict[str, str]:
+        return await self.client.hgetall(self.prefix + key)
+
+    async def hset(self, key: str, field: str, value) -> None:
+        await self.client.hset(self.prefix + key, field, value)
+
+    async def hsetnx(self, key: str, field: str, value) -> bool:
+        return bool(await self.client.hsetnx(self.prefix + key, field, value))
+
+    async def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        return await self.client.hincrby(self.prefix + key, field, amount)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def create_storage(url: Optional[str] = Config.STORAGE_URL) -> Storage:
+    """Внешнее хранилище при заданном STORAGE_URL, иначе - в памяти"""
+    if url:
+        return RedisStorage.from_url(url)
+    return MemoryStorage()
+
+
+# Глобальное хранилище
+storage = create_storage()
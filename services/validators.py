@@ -1,8 +1,10 @@
-from typing import Tuple
-import pandas as pd
+from typing import TYPE_CHECKING, Tuple
 from aiogram.types import Message
 from config import Config
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 class FileValidator:
     """Класс для валидации файлов"""
@@ -20,10 +22,10 @@ class FileValidator:
         if not message.document:
             return False
         filename = message.document.file_name or ""
-        return filename.endswith((".xlsx", ".xls"))
+        return filename.lower().endswith((".xlsx", ".xls", ".csv", ".zip"))
 
     @staticmethod
-    def validate_columns(df: pd.DataFrame, required_columns: list) -> Tuple[bool, list]:
+    def validate_columns(df: "pd.DataFrame", required_columns: list) -> Tuple[bool, list]:
         """Проверка наличия необходимых колонок"""
         df.columns = df.columns.str.strip()
         missing_columns = [col for col in required_columns if col not in df.columns]
@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+from config import Config
+from utils.logger import logger
+from .worker_pool import worker_pool
+
+
+def preload() -> None:
+    """Импорт тяжелых модулей и подготовка matplotlib в текущем процессе"""
+    from .report_renderer import ReportRenderer  # noqa: F401 - pandas, openpyxl
+    from .report_generator import ReportGenerator
+
+    ReportGenerator.warm_up()
+
+
+async def warm_up() -> None:
+    """Фоновый прогрев после старта бота: первый пользователь не ждет
+    загрузки библиотек, шрифтов и запуска процессов пула"""
+    if not Config.WARMUP:
+        return
+
+    started = time.perf_counter()
+    try:
+        # В главном процессе - в потоке, чтобы не блокировать event loop
+        await asyncio.to_thread(preload)
+
+        # Каждый процесс пула запускается и импортирует модули заранее
+        if worker_pool.kind == "process":
+            await asyncio.gather(
+                *(worker_pool.run(preload) for _ in range(worker_pool.size))
+            )
+    except Exception as e:
+        logger.warning(f"Warm-up failed: {e}")
+        return
+
+    logger.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,108 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from config import Config
+
+
+class WorkerPool:
+    """Пул для тяжелых вычислений (pandas, openpyxl, matplotlib) вне event loop"""
+
+    def __init__(
+        self, kind: str = Config.WORKER_POOL_KIND, size: int = Config.WORKER_POOL_SIZE
+    ):
+        self.kind = kind
+        self.size = max(1, size)
+        self._executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Последняя задача каждого владельца, отправленная в пул
+        self._owners: Dict[Hashable, Future] = {}
+
+    def _get_executor(self) -> Executor:
+        """Ленивое создание пула процессов или потоков"""
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.size,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.size, thread_name_prefix="wb-worker"
+                )
+        return self._executor
+
+    async def run(
+        self, func: Callable[..., Any], *args, owner: Optional[Hashable] = None
+    ) -> Any:
+        """Выполнение функции в пуле с ограничением числа одновременных задач.
+
+        Задачи одного владельца занимают не больше одного слота: новая ждет,
+        пока в пуле завершится предыдущая, даже если ту уже отменили.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.size)
+            self._loop = asyncio.get_running_loop()
+
+        while True:
+            if owner is not None:
+                previous = self._owners.get(owner)
+                while previous is not None and not previous.done():
+                    await asyncio.wait([asyncio.wrap_future(previous)])
+                    previous = self._owners.get(owner)
+
+            await self._semaphore.acquire()
+            # Пока ждали слот, другая задача владельца могла попасть в пул раньше
+            previous = self._owners.get(owner) if owner is not None else None
+            if previous is None or previous.done():
+                break
+            self._semaphore.release()
+
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+        # Слот освобождается только когда задача действительно завершилась в пуле,
+        # даже если ожидающий ее обработчик был отменен по таймауту
+        future.add_done_callback(self._release)
+        if owner is not None:
+            self._owners[owner] = future
+            future.add_done_callback(lambda done: self._forget(owner, done))
+        return await asyncio.wrap_future(future)
+
+    def _forget(self, owner: Hashable, future: Future) -> None:
+        """Удаление завершенной задачи владельца (из потока пула)"""
+        try:
+            self._loop.call_soon_threadsafe(self._forget_owner, owner, future)
+        except RuntimeError:
+            pass  # event loop уже закрыт
+
+    def _forget_owner(self, owner: Hashable, future: Future) -> None:
+        if self._owners.get(owner) is future:
+            del self._owners[owner]
+
+    def _release(self, _future) -> None:
+        """Освобождение слота из потока пула"""
+        try:
+            self._loop.call_soon_threadsafe(self._semaphore.release)
+        except RuntimeError:
+            pass  # event loop уже закрыт
+
+    def shutdown(self) -> None:
+        """Остановка пула"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Глобальный пул для тяжелых вычислений
+worker_pool = WorkerPool()
@@ -6,5 +6,8 @@ class AnalyticsState(StatesGroup):
 
     waiting_for_tax = State()
     waiting_for_main_file = State()
+    waiting_for_extra_main_file = State()
     waiting_for_cost_file = State()
     ready_for_analysis = State()
+    changing_tax = State()
+    waiting_for_new_tax = State()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# config.py требует токен при импорте; тестам настоящий бот не нужен
+os.environ.setdefault("BOT_TOKEN", "123456:test-token")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
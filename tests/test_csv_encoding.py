@@ -0,0 +1,45 @@
+import io
+import zipfile
+from io import BytesIO
+
+import pytest
+
+from services.data_processor import DataProcessor
+
+COST_CSV = "Артикул поставщика;Себестоимость\nКружка-белая;120,5\n"
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "utf-8-sig", "cp1251"])
+def test_cost_csv_encodings(encoding):
+    cost_df = DataProcessor.read_cost_table(
+        BytesIO(COST_CSV.encode(encoding)), "cost.csv"
+    )
+
+    assert list(cost_df["Артикул поставщика"]) == ["Кружка-белая"]
+    assert list(cost_df["Себестоимость"]) == [120.5]
+
+
+def test_cp1251_csv_inside_zip():
+    archive = BytesIO()
+    with zipfile.ZipFile(archive, "w") as output:
+        output.writestr("cost.csv", COST_CSV.encode("cp1251"))
+    archive.seek(0)
+
+    cost_df = DataProcessor.read_cost_table(archive, "cost.zip")
+
+    assert list(cost_df["Артикул поставщика"]) == ["Кружка-белая"]
+
+
+def test_undecodable_csv_gives_readable_error():
+    # Начало в UTF-8, а дальше - байты, которые в ней не читаются
+    data = (COST_CSV + "x;1\n" * 20_000).encode("utf-8") + b"\xff\xfe;1\n"
+
+    with pytest.raises(ValueError, match="кодировке") as error:
+        DataProcessor.read_cost_table(BytesIO(data), "cost.csv")
+    assert not isinstance(error.value, UnicodeDecodeError)
+
+
+def test_stream_stays_open_after_reading():
+    stream = io.BytesIO(COST_CSV.encode("cp1251"))
+    DataProcessor.read_cost_table(stream, "cost.csv")
+    assert not stream.closed
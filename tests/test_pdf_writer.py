@@ -0,0 +1,169 @@
+import re
+import zlib
+from io import BytesIO
+
+import pandas as pd
+from fontTools.ttLib import TTFont
+
+from services.pdf_writer import PdfWriter
+from services.report_generator import ReportGenerator
+
+RUSSIAN = "АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯабвгдеёжзийклмнопрстуфхцчшщъыьэюя"
+
+
+def _objects(data: bytes) -> dict:
+    """Объекты PDF по таблице ссылок: номер -> (словарь, распакованный поток)"""
+    xref = int(re.search(rb"startxref\n(\d+)\n%%EOF\n$", data).group(1))
+    lines = data[xref:].split(b"\n")
+    assert lines[0] == b"xref"
+    count = int(lines[1].split()[1])
+    objects = {}
+    for object_id in range(1, count):
+        offset = int(lines[2 + object_id][:10])
+        header_start = data.index(b"\n", offset) + 1
+        assert data[offset:header_start] == f"{object_id} 0 obj\n".encode()
+        header_end = data.index(b"\n", header_start)
+        header = data[header_start:header_end].decode("latin-1")
+        stream = None
+        if data.startswith(b"\nstream\n", header_end):
+            start = header_end + len(b"\nstream\n")
+            length = int(re.search(r"/Length (\d+)", header).group(1))
+            assert data[start + length :].startswith(b"\nendstream\nendobj\n")
+            stream = data[start : start + length]
+            if "/FlateDecode" in header:
+                stream = zlib.decompress(stream)
+        objects[object_id] = (header, stream)
+    return objects
+
+
+def _ref(header: str, name: str) -> int:
+    return int(re.search(rf"/{name} (\d+) 0 R", header).group(1))
+
+
+def _pages(objects: dict) -> list:
+    """Словари страниц в порядке следования"""
+    kids = re.search(r"/Kids \[([^\]]*)\]", objects[2][0]).group(1)
+    return [objects[int(ref)][0] for ref in re.findall(r"(\d+) 0 R", kids)]
+
+
+def _to_unicode(objects: dict, font_id: int) -> dict:
+    """Глиф (hex) -> символ по таблице ToUnicode шрифта"""
+    cmap = objects[_ref(objects[font_id][0], "ToUnicode")][1].decode("latin-1")
+    entries = "".join(re.findall(r"beginbfchar\n(.*?)endbfchar", cmap, re.S))
+    return {
+        gid: bytes.fromhex(char).decode("utf-16-be")
+        for gid, char in re.findall(r"<([0-9a-f]{4})> <([0-9a-f]+)>", entries)
+    }
+
+
+def _page_text(objects: dict, page: str) -> list:
+    """Строки текста страницы в порядке вывода: (текст, x, y)"""
+    fonts = {
+        name: _to_unicode(objects, int(font_id))
+        for name, font_id in re.findall(r"/(F\d) (\d+) 0 R", page)
+    }
+    content = objects[_ref(page, "Contents")][1].decode("latin-1")
+    lines = []
+    for name, x, y, glyphs in re.findall(
+        r"/(F\d) [\d.]+ Tf ([-\d.]+) ([-\d.]+) Td <([0-9a-f]*)> Tj", content
+    ):
+        text = "".join(
+            fonts[name][glyphs[i : i + 4]] for i in range(0, len(glyphs), 4)
+        )
+        lines.append((text, float(x), float(y)))
+    return lines
+
+
+def _write(pages) -> bytes:
+    output = BytesIO()
+    with PdfWriter(output) as pdf:
+        for page in pages:
+            for y, (text, bold) in enumerate(page):
+                pdf.text(50, 500 - 20 * y, text, bold=bold)
+            pdf.new_page()
+    return output.getvalue()
+
+
+def test_text_is_extracted_as_written():
+    pages = [
+        [("Ключевые бизнес-метрики", True), ("Общая выручка: 1,234,567 ₽", False)],
+        [("Артикул AB-7 (Кружка «белая»)", False), ("Маржинальность 12.5%", True)],
+    ]
+
+    objects = _objects(_write(pages))
+
+    assert [
+        [text for text, _, _ in _page_text(objects, page)]
+        for page in _pages(objects)
+    ] == [[text for text, _ in page] for page in pages]
+
+
+def test_cyrillic_glyphs_are_embedded():
+    objects = _objects(_write([[(RUSSIAN, False), (RUSSIAN, True)]]))
+    page = _pages(objects)[0]
+
+    for font_id in re.findall(r"/F\d (\d+) 0 R", page):
+        font = objects[int(font_id)][0]
+        descendant = re.search(r"/DescendantFonts \[(\d+) 0 R\]", font).group(1)
+        cid_font = objects[int(descendant)][0]
+        descriptor = objects[_ref(cid_font, "FontDescriptor")][0]
+        embedded = TTFont(BytesIO(objects[_ref(descriptor, "FontFile2")][1]))
+        order = embedded.getGlyphOrder()
+        cmap = embedded.getBestCmap()
+        scale = 1000 / embedded["head"].unitsPerEm
+        widths = {
+            int(gid): int(width)
+            for gid, width in re.findall(r"(\d+) \[(\d+)\]", cid_font)
+        }
+
+        for gid, char in _to_unicode(objects, int(font_id)).items():
+            glyph = order[int(gid, 16)]
+            # Глиф с контурами на месте, указанном в тексте (CIDToGIDMap Identity)
+            assert cmap[ord(char)] == glyph
+            # Составные глифы (Ё, Й) рисуются вместе с компонентами
+            glyf = embedded["glyf"]
+            coordinates, _, _ = glyf[glyph].getCoordinates(glyf)
+            assert len(coordinates) > 0
+            advance = embedded["hmtx"][glyph][0]
+            assert widths[int(gid, 16)] == round(advance * scale)
+        assert set(_to_unicode(objects, int(font_id)).values()) == set(RUSSIAN)
+
+
+def _analysis(rows: int) -> pd.DataFrame:
+    profit = [1000.0 - 10 * i for i in range(rows)]
+    return pd.DataFrame(
+        {
+            "Артикул поставщика": [f"Кружка-{i}" for i in range(rows)],
+            "Количество продаж": [3] * rows,
+            "Выручка": [1500.0] * rows,
+            "Чистая прибыль": profit,
+            "Маржинальность": [p / 1500 for p in profit],
+            "Рентабельность": [0.5] * rows,
+        }
+    )
+
+
+def test_report_pages_metrics_charts_table():
+    rows_per_page = ReportGenerator.table_rows_per_page()
+    rows = rows_per_page + 5
+    pdf = ReportGenerator.generate_comprehensive_pdf(_analysis(rows)).getvalue()
+
+    objects = _objects(pdf)
+    pages = _pages(objects)
+    texts = [_page_text(objects, page) for page in pages]
+
+    assert len(pages) == 4
+    assert texts[0][0][0] == "Ключевые бизнес-метрики"
+    # Графики - одно изображение без текста
+    assert texts[1] == [] and "/Im0" in pages[1]
+    for number, page in enumerate(texts[2:], 1):
+        assert page[0][0].startswith("Финансовые показатели по товарам")
+        assert page[-1][0] == f"Стр. {number} из 2"
+        # Строки таблицы не заходят на колонтитул
+        footer_y = page[-1][2]
+        lowest = min(y for _, _, y in page[:-1])
+        assert lowest > footer_y + ReportGenerator.TABLE_FONT_SIZE
+    skus = [
+        text for page in texts[2:] for text, _, _ in page if text.startswith("Кружка-")
+    ]
+    assert skus == [f"Кружка-{i}" for i in range(rows)]
@@ -0,0 +1,111 @@
+import asyncio
+from datetime import datetime
+
+import pandas as pd
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage as FSMMemoryStorage
+from aiogram.types import Chat, Message, User
+
+from bot import middlewares
+from bot.middlewares import SessionMiddleware
+from services.session_manager import SessionManager
+from services.storage import MemoryStorage
+from states.analytics import AnalyticsState
+
+USER_ID = 42
+
+
+def _restart(storage: MemoryStorage, monkeypatch) -> SessionManager:
+    """Новый процесс бота: сессии пусты, внешнее хранилище то же"""
+    manager = SessionManager(storage=storage)
+    monkeypatch.setattr(middlewares, "session_manager", manager)
+    return manager
+
+
+def _context(fsm_storage: FSMMemoryStorage) -> FSMContext:
+    key = StorageKey(bot_id=1, chat_id=USER_ID, user_id=USER_ID)
+    return FSMContext(storage=fsm_storage, key=key)
+
+
+def _message(text: str) -> Message:
+    return Message(
+        message_id=1,
+        date=datetime.now(),
+        chat=Chat(id=USER_ID, type="private"),
+        from_user=User(id=USER_ID, is_bot=False, first_name="Test"),
+        text=text,
+    )
+
+
+async def _dispatch(state: FSMContext, event: Message):
+    """Прогон события через middleware; возвращает данные, увиденные обработчиком"""
+    seen = {}
+
+    async def handler(event, data):
+        seen.update(data)
+
+    data = {
+        "event_from_user": event.from_user,
+        "state": state,
+        "raw_state": await state.get_state(),
+    }
+    await SessionMiddleware()(handler, event, data)
+    return seen
+
+
+def test_tax_rate_survives_restart(monkeypatch):
+    async def scenario():
+        storage = MemoryStorage()
+        fsm_storage = FSMMemoryStorage()
+        state = _context(fsm_storage)
+
+        manager = _restart(storage, monkeypatch)
+        session = manager.get_session(USER_ID)
+        await manager.set_tax_rate(session, 15.0)
+        await state.set_state(AnalyticsState.waiting_for_main_file)
+
+        manager = _restart(storage, monkeypatch)
+        seen = await _dispatch(state, _message("hello"))
+
+        assert manager.get_session(USER_ID).tax_rate == 15.0
+        assert seen["raw_state"] == AnalyticsState.waiting_for_main_file.state
+
+    asyncio.run(scenario())
+
+
+def test_state_without_session_data_is_reset(monkeypatch):
+    async def scenario():
+        storage = MemoryStorage()
+        state = _context(FSMMemoryStorage())
+
+        manager = _restart(storage, monkeypatch)
+        session = manager.get_session(USER_ID)
+        session.main_df = pd.DataFrame({"Артикул поставщика": ["100012"]})
+        await state.set_state(AnalyticsState.waiting_for_cost_file)
+
+        _restart(storage, monkeypatch)
+        seen = await _dispatch(state, _message("/start"))
+
+        expected = AnalyticsState.waiting_for_main_file.state
+        assert await state.get_state() == expected
+        assert seen["raw_state"] == expected
+
+    asyncio.run(scenario())
+
+
+def test_state_with_session_data_is_kept(monkeypatch):
+    async def scenario():
+        state = _context(FSMMemoryStorage())
+        manager = _restart(MemoryStorage(), monkeypatch)
+        session = manager.get_session(USER_ID)
+        session.main_df = pd.DataFrame({"Артикул поставщика": ["100012"]})
+        await state.set_state(AnalyticsState.waiting_for_cost_file)
+
+        seen = await _dispatch(state, _message("/start"))
+
+        expected = AnalyticsState.waiting_for_cost_file.state
+        assert await state.get_state() == expected
+        assert seen["raw_state"] == expected
+
+    asyncio.run(scenario())
@@ -0,0 +1,65 @@
+from io import BytesIO
+
+import pandas as pd
+
+from services.data_processor import DataProcessor
+
+
+def _main_report_xlsx(skus) -> BytesIO:
+    """Основной отчет, где артикулы - ячейки-числа"""
+    rows = len(skus)
+    df = pd.DataFrame(
+        {
+            "Артикул поставщика": skus,
+            "Тип документа": ["Продажа"] * rows,
+            "Обоснование для оплаты": ["Продажа"] * rows,
+            "Цена розничная": [1000.0] * rows,
+            "Вайлдберриз реализовал Товар (Пр)": [900.0] * rows,
+            "К перечислению Продавцу за реализованный Товар": [800.0] * rows,
+            "Общая сумма штрафов": [0.0] * rows,
+            "Услуги по доставке товара покупателю": [0.0] * rows,
+            "Хранение": [0.0] * rows,
+            "Виды логистики, штрафов и корректировок ВВ": [None] * rows,
+        }
+    )
+    output = BytesIO()
+    df.to_excel(output, index=False)
+    output.seek(0)
+    return output
+
+
+def test_xlsx_main_report_joins_csv_cost_file():
+    skus = [100012, 100013, "AB-7", 100014]
+    main_df = DataProcessor.finalize_main_report(
+        DataProcessor.aggregate_main_report(_main_report_xlsx(skus), "main.xlsx")
+    )
+    cost_csv = BytesIO(
+        "Артикул поставщика;Себестоимость\n"
+        "100012;100\n100013;200\nAB-7;300\n 100014 ;400,5\n".encode("utf-8")
+    )
+    cost_df = DataProcessor.read_cost_table(cost_csv, "cost.csv")
+
+    final_df = DataProcessor.merge_cost_data(main_df, cost_df, 6)
+
+    costs = dict(zip(final_df["Артикул поставщика"], final_df["Себестоимость"]))
+    assert costs == {"100012": 100.0, "100013": 200.0, "AB-7": 300.0, "100014": 400.5}
+
+
+def test_same_sku_from_csv_and_xlsx_is_one_row():
+    xlsx_partial = DataProcessor.aggregate_main_report(
+        _main_report_xlsx([100012]), "main.xlsx"
+    )
+    csv_partial = DataProcessor.aggregate_main_report(
+        BytesIO(
+            (
+                ";".join(DataProcessor.MAIN_REPORT_COLUMNS)
+                + "\n100012;Продажа;Продажа;;1000;900;800;0;0;0\n"
+            ).encode("utf-8")
+        ),
+        "main.csv",
+    )
+
+    merged = DataProcessor.merge_partials(xlsx_partial, csv_partial)
+
+    assert list(merged.index) == ["100012"]
+    assert merged.loc["100012", "Строк продаж"] == 2
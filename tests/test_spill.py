@@ -0,0 +1,56 @@
+import pandas as pd
+import pandas.testing as tm
+
+from services.data_processor import DataProcessor
+from services.spill import read_frame, write_frame
+
+
+def _partial(skus) -> pd.DataFrame:
+    """Частичные агрегаты с индексом артикулов, как у main_partial"""
+    index = pd.CategoricalIndex(skus, name="Артикул поставщика")
+    return pd.DataFrame(
+        {"Строк продаж": [1] * len(skus), "Выручка": [100.0] * len(skus)},
+        index=index,
+    )
+
+
+def test_mixed_sku_partial_round_trips(tmp_path):
+    # Артикулы-числа вперемешку со строками Arrow одним типом не сохранит
+    partial = _partial([100012, "AB-7", 100013])
+
+    path = write_frame(partial, str(tmp_path), "partial_")
+
+    tm.assert_frame_equal(read_frame(path), partial)
+
+
+def test_mixed_sku_main_df_round_trips(tmp_path):
+    main_df = DataProcessor.finalize_main_report(
+        _partial([100012, "AB-7"]).assign(
+            **{
+                column: 1.0
+                for column in (
+                    "Количество продаж",
+                    "Количество Вайлдберриз",
+                    "Сумма Вайлдберриз",
+                    "Сумма к перечислению",
+                    "Сумма услуг доставки",
+                    "Сумма штрафов",
+                    "Хранение",
+                    "Сумма WB Продвижение",
+                )
+            }
+        )
+    )
+
+    path = write_frame(main_df, str(tmp_path), "main_")
+
+    tm.assert_frame_equal(read_frame(path), main_df)
+
+
+def test_text_sku_partial_uses_feather(tmp_path):
+    partial = _partial(["100012", "AB-7"])
+
+    path = write_frame(partial, str(tmp_path), "partial_")
+
+    assert path.endswith(".feather")
+    tm.assert_frame_equal(read_frame(path), partial)
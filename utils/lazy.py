@@ -0,0 +1,25 @@
+import importlib
+from typing import Any, Optional
+
+
+class LazyImport:
+    """Модуль (или объект из модуля), импортируемый при первом обращении.
+
+    Тяжелые библиотеки (pandas, matplotlib, openpyxl) подгружаются не при
+    старте бота, а при первом использовании сервиса, который их требует.
+    """
+
+    def __init__(self, module: str, name: Optional[str] = None):
+        self._module = module
+        self._name = name
+        self._target = None
+
+    def _load(self) -> Any:
+        """Импорт при первом обращении"""
+        if self._target is None:
+            module = importlib.import_module(self._module)
+            self._target = getattr(module, self._name) if self._name else module
+        return self._target
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._load(), item)